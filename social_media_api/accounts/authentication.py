@@ -0,0 +1,127 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+KEY_PREFIX = 'auth:token'
+
+
+def digest(key):
+    # Raw tokens never end up in cache keys or process memory dumps.
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def cache_key(token_digest):
+    return f'{KEY_PREFIX}:{token_digest}'
+
+
+class LocalTokenCache:
+    """
+    Small thread-safe LRU of ``digest -> user`` entries with a TTL.
+
+    Entries are only invalidated in the process that saw the change, so
+    the TTL bounds how long another process keeps accepting a revoked
+    token.
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, token_digest):
+        with self._lock:
+            entry = self._entries.get(token_digest)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self._entries[token_digest]
+                return None
+            self._entries.move_to_end(token_digest)
+            return user
+
+    def set(self, token_digest, user):
+        with self._lock:
+            self._entries[token_digest] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(token_digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, token_digest):
+        with self._lock:
+            self._entries.pop(token_digest, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_cache = LocalTokenCache(
+    getattr(settings, 'AUTH_TOKEN_LOCAL_CACHE_SIZE', 10000),
+    getattr(settings, 'AUTH_TOKEN_LOCAL_CACHE_TTL', 30),
+)
+
+_stats_lock = threading.Lock()
+_stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = sum(stats.values())
+    stats['lookups'] = lookups
+    stats['hit_rate'] = (stats['local_hits'] + stats['shared_hits']) / lookups if lookups else None
+    stats['local_entries'] = len(local_cache)
+    return stats
+
+
+def invalidate_tokens(keys):
+    """
+    Drop the cached users behind the given raw token ``keys``.
+    """
+    digests = [digest(key) for key in keys]
+    for token_digest in digests:
+        local_cache.delete(token_digest)
+    cache.delete_many([cache_key(token_digest) for token_digest in digests])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    ``TokenAuthentication`` that resolves tokens from an in-process LRU,
+    then the shared Django cache, and only then the database.
+
+    Cached entries are dropped when the token is deleted or its user is
+    saved (password change, deactivation, profile edits); see
+    ``accounts.signals``.
+    """
+    def authenticate_credentials(self, key):
+        token_digest = digest(key)
+        user = local_cache.get(token_digest)
+        if user is not None:
+            _count('local_hits')
+        else:
+            user = cache.get(cache_key(token_digest))
+            if user is not None:
+                _count('shared_hits')
+            else:
+                _count('misses')
+                user, _ = super().authenticate_credentials(key)
+                cache.set(cache_key(token_digest), user, getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 300))
+            local_cache.set(token_digest, user)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        # Each request gets its own instance so views can modify it freely.
+        user = copy.copy(user)
+        return user, self.get_model()(key=key, user=user)
@@ -0,0 +1,125 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+
+def max_results():
+    return getattr(settings, 'AUTOCOMPLETE_MAX_RESULTS', 20)
+
+
+def reload_interval():
+    # Follower counts move with F() updates that send no signals, so the
+    # ranking is refreshed from the database this often.
+    return getattr(settings, 'AUTOCOMPLETE_RELOAD_INTERVAL', 600)
+
+
+def memo_depth():
+    return getattr(settings, 'AUTOCOMPLETE_MEMO_DEPTH', 2)
+
+
+class UsernameIndex:
+    """
+    In-memory prefix index over active usernames, ranked by follower count.
+
+    Lower-cased usernames are kept in a sorted list with a parallel list of
+    user ids, so the users matching a prefix are one contiguous slice found
+    by two bisections. Short prefixes match large slices, so their top
+    results are memoized and dropped whenever a username under them
+    changes.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = None
+        self._ids = []
+        self._users = {}
+        self._memo = {}
+        self._loaded_at = None
+
+    def load(self):
+        from .models import CoustomUser
+
+        rows = CoustomUser.objects.filter(is_active=True).values_list('id', 'username', 'follower_count')
+        users = {user_id: (username, follower_count) for user_id, username, follower_count in rows.iterator()}
+        entries = sorted((username.lower(), user_id) for user_id, (username, _) in users.items())
+        with self._lock:
+            self._keys = [key for key, _ in entries]
+            self._ids = [user_id for _, user_id in entries]
+            self._users = users
+            self._memo = {}
+            self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self):
+        if self._keys is None or time.monotonic() - self._loaded_at > reload_interval():
+            self.load()
+
+    def _forget(self, key):
+        for depth in range(1, min(len(key), memo_depth()) + 1):
+            self._memo.pop(key[:depth], None)
+
+    def _remove(self, user_id):
+        username, _ = self._users.pop(user_id)
+        key = username.lower()
+        index = bisect_left(self._keys, key)
+        while self._ids[index] != user_id:
+            index += 1
+        del self._keys[index]
+        del self._ids[index]
+        self._forget(key)
+
+    def update(self, user_id, username, follower_count, is_active=True):
+        """
+        Add, rename, re-rank or (when inactive) drop a user.
+        """
+        with self._lock:
+            if self._keys is None:
+                return
+            if user_id in self._users:
+                self._remove(user_id)
+            if not is_active:
+                return
+            key = username.lower()
+            index = bisect_left(self._keys, key)
+            self._keys.insert(index, key)
+            self._ids.insert(index, user_id)
+            self._users[user_id] = (username, follower_count)
+            self._forget(key)
+
+    def remove(self, user_id):
+        with self._lock:
+            if self._keys is not None and user_id in self._users:
+                self._remove(user_id)
+
+    def _top(self, prefix, limit):
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix + '\U0010ffff', start)
+        users = self._users
+        ranked = heapq.nsmallest(
+            limit, self._ids[start:end],
+            key=lambda user_id: (-users[user_id][1], users[user_id][0].lower()),
+        )
+        return [(user_id, *users[user_id]) for user_id in ranked]
+
+    def search(self, prefix, limit=10):
+        """
+        Up to ``limit`` ``(user_id, username, follower_count)`` tuples whose
+        username starts with ``prefix`` (case-insensitive), most followed
+        first.
+        """
+        self.ensure_loaded()
+        prefix = prefix.lower()
+        if not prefix:
+            return []
+        limit = min(limit, max_results())
+        with self._lock:
+            if len(prefix) > memo_depth():
+                return self._top(prefix, limit)
+            top = self._memo.get(prefix)
+            if top is None:
+                top = self._memo[prefix] = self._top(prefix, max_results())
+            return top[:limit]
+
+
+index = UsernameIndex()
@@ -0,0 +1,56 @@
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed
+
+from .models import CoustomUser, Follow
+
+
+def _changed(user, followee_id, action):
+    # The raw statements below skip m2m_changed, which keeps the follow
+    # graph and the feed caches current; send it as user.following would.
+    m2m_changed.send(
+        sender=Follow, instance=user, action=action, reverse=True,
+        model=CoustomUser, pk_set={followee_id}, using=connection.alias,
+    )
+
+
+def _adjust_counters(user_id, followee_id, delta):
+    CoustomUser.objects.filter(pk=followee_id).update(follower_count=F('follower_count') + delta)
+    CoustomUser.objects.filter(pk=user_id).update(following_count=F('following_count') + delta)
+
+
+def follow(user, followee):
+    """
+    Make ``user`` follow ``followee`` with a single
+    ``INSERT ... ON CONFLICT DO NOTHING``. Counters only move when the row
+    was inserted, so concurrent requests cannot count a follow twice.
+    Returns whether anything changed.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {table} (from_coustomuser_id, to_coustomuser_id) VALUES (%s, %s) '
+                'ON CONFLICT (from_coustomuser_id, to_coustomuser_id) DO NOTHING RETURNING id'.format(
+                    table=Follow._meta.db_table,
+                ),
+                [followee.pk, user.pk],
+            )
+            if cursor.fetchone() is None:
+                return False
+        _adjust_counters(user.pk, followee.pk, 1)
+        _changed(user, followee.pk, 'post_add')
+    return True
+
+
+def unfollow(user, followee):
+    """
+    Remove ``user``'s follow of ``followee``; counters only move when a row
+    was deleted. Returns whether anything changed.
+    """
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(from_coustomuser=followee, to_coustomuser=user).delete()
+        if not deleted:
+            return False
+        _adjust_counters(user.pk, followee.pk, -1)
+        _changed(user, followee.pk, 'post_remove')
+    return True
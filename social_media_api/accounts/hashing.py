@@ -0,0 +1,120 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+
+
+def pool_enabled():
+    return getattr(settings, 'PASSWORD_HASH_POOL', True)
+
+
+def pool_size():
+    return getattr(settings, 'PASSWORD_HASH_WORKERS', None) or os.cpu_count() or 1
+
+
+def queue_depth():
+    # Hashing jobs allowed to wait for a worker before new ones are refused.
+    return getattr(settings, 'PASSWORD_HASH_QUEUE_DEPTH', 2 * pool_size())
+
+
+def timeout():
+    return getattr(settings, 'PASSWORD_HASH_TIMEOUT', 10)
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Authentication is temporarily unavailable, try again shortly.'
+    default_code = 'hashing_unavailable'
+
+
+def _verify(password, encoded):
+    # Runs in a pool worker.
+    if not hashers.check_password(password, encoded):
+        return False, False
+    return True, hashers.identify_hasher(encoded).must_update(encoded)
+
+
+class HashingPool:
+    """
+    Bounded process pool for password hashing, so a burst of logins cannot
+    starve the request workers.
+
+    At most ``PASSWORD_HASH_WORKERS`` hashes run at once and
+    ``PASSWORD_HASH_QUEUE_DEPTH`` more may wait; past that callers get a
+    429 straight away instead of queueing behind the burst.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=pool_size(), initializer=django.setup)
+                self._slots = threading.BoundedSemaphore(pool_size() + queue_depth())
+            return self._executor, self._slots
+
+    def _reset(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, func, *args):
+        if not pool_enabled():
+            return func(*args)
+        executor, slots = self._get_executor()
+        if not slots.acquire(blocking=False):
+            raise Throttled(wait=1, detail='Too many authentication requests in progress, try again shortly.')
+        try:
+            future = executor.submit(func, *args)
+        except (BrokenProcessPool, RuntimeError):
+            # Broken, or shut down by another thread's reset.
+            slots.release()
+            self._reset(executor)
+            raise HashingUnavailable()
+        # A job that outlives our timeout still occupies a worker, so its
+        # slot is only given back once it has actually finished.
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=timeout())
+        except FutureTimeoutError:
+            future.cancel()
+            raise HashingUnavailable()
+        except BrokenProcessPool:
+            self._reset(executor)
+            raise HashingUnavailable()
+
+
+pool = HashingPool()
+
+
+def make_password(password):
+    return pool.run(hashers.make_password, password)
+
+
+def check_password(user, password):
+    """
+    Off-process ``user.check_password``, upgrading outdated hashes the same
+    way Django does.
+    """
+    valid, must_update = pool.run(_verify, password, user.password)
+    if valid and must_update:
+        user.password = make_password(password)
+        user.save(update_fields=['password'])
+    return valid
+
+
+def burn_password(password):
+    """
+    Hash ``password`` for nothing, so unknown usernames take as long to
+    reject as wrong passwords.
+    """
+    pool.run(hashers.make_password, password)
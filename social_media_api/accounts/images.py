@@ -0,0 +1,174 @@
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+ORIGINALS_DIR = 'profile_pics/originals'
+THUMBNAILS_DIR = 'profile_pics/thumbs'
+DEFAULT_SIZES = {
+    'small': 64,
+    'medium': 256,
+    'large': 512,
+}
+# format -> (file extension, Pillow save options)
+FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def get_sizes():
+    return getattr(settings, 'PROFILE_PICTURE_SIZES', DEFAULT_SIZES)
+
+
+def _sharded(directory, digest, filename):
+    # Two levels of fan-out keep directories small.
+    return f'{directory}/{digest[:2]}/{digest[2:4]}/{filename}'
+
+
+def digest_of(name):
+    """
+    Content digest a stored original's name was derived from.
+    """
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def store_original(upload):
+    """
+    Stream ``upload`` through SHA-256 into storage under a content-addressed
+    name and return that name. Identical images share one stored file.
+    """
+    sha = hashlib.sha256()
+    with tempfile.TemporaryFile() as spool:
+        for chunk in upload.chunks():
+            sha.update(chunk)
+            spool.write(chunk)
+        extension = os.path.splitext(upload.name or '')[1].lower()
+        if not (2 <= len(extension) <= 6 and extension[1:].isalnum()):
+            extension = '.img'
+        name = _sharded(ORIGINALS_DIR, sha.hexdigest(), sha.hexdigest() + extension)
+        if not default_storage.exists(name):
+            spool.seek(0)
+            stored = default_storage.save(name, File(spool))
+            if stored != name:
+                # Lost a race with an identical upload; keep the first copy.
+                default_storage.delete(stored)
+    return name
+
+
+def thumbnail_name(digest, size, fmt):
+    extension, _ = FORMATS[fmt]
+    return _sharded(THUMBNAILS_DIR, digest, f'{digest}_{size}.{extension}')
+
+
+def thumbnail_urls(name):
+    """
+    ``{size: {format: url}}`` for a processed original.
+    """
+    digest = digest_of(name)
+    return {
+        size: {fmt: default_storage.url(thumbnail_name(digest, size, fmt)) for fmt in FORMATS}
+        for size in get_sizes()
+    }
+
+
+def make_thumbnails(name):
+    """
+    Write every size/format thumbnail of the stored original ``name`` that
+    does not exist yet.
+    """
+    digest = digest_of(name)
+    with default_storage.open(name, 'rb') as original:
+        image = Image.open(original)
+        largest = max(get_sizes().values())
+        # Lets the JPEG decoder downscale while decoding.
+        image.draft('RGB', (largest * 2, largest * 2))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    for size, pixels in get_sizes().items():
+        fitted = ImageOps.fit(image, (pixels, pixels), Image.Resampling.LANCZOS)
+        for fmt, (_, options) in FORMATS.items():
+            target = thumbnail_name(digest, size, fmt)
+            if default_storage.exists(target):
+                continue
+            # WebP keeps transparency, JPEG cannot.
+            frame = fitted.convert('RGB') if fmt == 'jpeg' else fitted
+            buffer = io.BytesIO()
+            frame.save(buffer, **options)
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+
+
+class ThumbnailPool:
+    """
+    Thread pool that renders thumbnails off the request path. Pillow
+    releases the GIL while decoding, resampling and encoding, so threads
+    use several cores.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'PROFILE_PICTURE_WORKERS', 2),
+                    thread_name_prefix='thumbnails',
+                )
+            return self._executor
+
+    def submit(self, user_id, name):
+        return self._get_executor().submit(process, user_id, name)
+
+
+pool = ThumbnailPool()
+
+
+def process(user_id, name):
+    """
+    Render thumbnails for ``name`` and flag ``user_id``'s picture as
+    processed, unless the user has changed pictures in the meantime.
+    """
+    from .models import CoustomUser
+
+    close_old_connections()
+    try:
+        make_thumbnails(name)
+        CoustomUser.objects.filter(pk=user_id, profile_picture=name).update(profile_picture_processed=True)
+    except Exception:
+        logger.exception('Could not process profile picture %s of user %s', name, user_id)
+    finally:
+        close_old_connections()
+
+
+def set_profile_picture(user, upload):
+    """
+    Store ``upload`` as ``user``'s picture. Call ``schedule(user)`` once the
+    user is saved.
+    """
+    user.profile_picture = store_original(upload)
+    user.profile_picture_processed = False
+
+
+def schedule(user):
+    """
+    Queue thumbnails of ``user``'s picture for after the current
+    transaction commits.
+    """
+    if user.profile_picture and not user.profile_picture_processed:
+        user_id, name = user.pk, user.profile_picture.name
+        transaction.on_commit(lambda: pool.submit(user_id, name))
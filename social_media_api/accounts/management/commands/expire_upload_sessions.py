@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts import uploads
+from accounts.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned resumable upload sessions and their partial files.'
+
+    def handle(self, *args, **options):
+        expired = UploadSession.objects.filter(expires_at__lte=timezone.now())
+        removed = 0
+        for session in expired.iterator():
+            uploads.discard(session)
+            session.delete()
+            removed += 1
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} expired upload sessions.'))
@@ -0,0 +1,31 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from accounts import images
+from accounts.models import CoustomUser
+
+
+class Command(BaseCommand):
+    help = 'Move unprocessed profile pictures to content-addressed storage and render their thumbnails.'
+
+    def handle(self, *args, **options):
+        users = (
+            CoustomUser.objects.filter(profile_picture_processed=False)
+            .exclude(profile_picture='').exclude(profile_picture__isnull=True)
+            .values_list('pk', 'profile_picture')
+        )
+        processed = failed = 0
+        for user_id, name in users.iterator():
+            try:
+                if not name.startswith(images.ORIGINALS_DIR + '/'):
+                    with default_storage.open(name, 'rb') as upload:
+                        name = images.store_original(upload)
+                    CoustomUser.objects.filter(pk=user_id).update(profile_picture=name)
+                images.make_thumbnails(name)
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f'User {user_id}: {exc}')
+                continue
+            CoustomUser.objects.filter(pk=user_id, profile_picture=name).update(profile_picture_processed=True)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} profile pictures, {failed} failed.'))
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:04
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    User = apps.get_model('accounts', 'CoustomUser')
+    Follow = User.followers.through
+
+    def count(field):
+        counts = (
+            Follow.objects.filter(**{field: OuterRef('pk')})
+            .order_by().values(field).annotate(total=Count('*')).values('total')
+        )
+        return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+    User.objects.update(follower_count=count('from_coustomuser'), following_count=count('to_coustomuser'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_rename_user_model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coustomuser',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='coustomuser',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_user_counters'),
+    ]
+
+    operations = [
+        # The table already exists as the implicit through table of
+        # CoustomUser.followers; only the model state changes.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Follow',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('from_coustomuser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                        ('to_coustomuser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'accounts_coustomuser_followers',
+                        'unique_together': {('from_coustomuser', 'to_coustomuser')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='coustomuser',
+                    name='followers',
+                    field=models.ManyToManyField(blank=True, related_name='following', through='accounts.Follow', through_fields=('from_coustomuser', 'to_coustomuser'), to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['from_coustomuser', '-id'], name='follow_followee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['to_coustomuser', '-id'], name='follow_follower_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_follow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coustomuser',
+            name='profile_picture_processed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
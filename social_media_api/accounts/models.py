@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
@@ -6,7 +8,54 @@ from django.contrib.auth.models import AbstractUser
 class CoustomUser(AbstractUser):
     bio=models.TextField(max_length=500,blank=True)
     profile_picture=models.ImageField(upload_to='profile_pics/',blank=True,null=True)
-    followers=models.ManyToManyField('self',symmetrical=False,related_name='following',blank=True)
+    # Set once the thumbnails in accounts.images exist.
+    profile_picture_processed=models.BooleanField(default=False)
+    followers=models.ManyToManyField(
+        'self',symmetrical=False,related_name='following',blank=True,
+        through='Follow',through_fields=('from_coustomuser','to_coustomuser'),
+    )
+    follower_count=models.PositiveIntegerField(default=0)
+    following_count=models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.username
+
+
+class Follow(models.Model):
+    """
+    Through table of ``CoustomUser.followers``: ``to_coustomuser`` follows
+    ``from_coustomuser``. Keeps the table and column names of the implicit
+    through model it replaced.
+    """
+    from_coustomuser=models.ForeignKey(CoustomUser,on_delete=models.CASCADE,related_name='+')
+    to_coustomuser=models.ForeignKey(CoustomUser,on_delete=models.CASCADE,related_name='+')
+
+    class Meta:
+        db_table='accounts_coustomuser_followers'
+        unique_together=[('from_coustomuser','to_coustomuser')]
+        indexes=[
+            models.Index(fields=['from_coustomuser','-id'],name='follow_followee_idx'),
+            models.Index(fields=['to_coustomuser','-id'],name='follow_follower_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.to_coustomuser} follows {self.from_coustomuser}"
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload being received in byte ranges. ``received`` bytes
+    have been written to the session's part file so far and ``crc32`` is
+    their running checksum.
+    """
+    id=models.UUIDField(primary_key=True,default=uuid.uuid4,editable=False)
+    user=models.ForeignKey(CoustomUser,on_delete=models.CASCADE,related_name='upload_sessions')
+    filename=models.CharField(max_length=255)
+    size=models.PositiveBigIntegerField()
+    received=models.PositiveBigIntegerField(default=0)
+    crc32=models.PositiveBigIntegerField(default=0)
+    created_at=models.DateTimeField(auto_now_add=True)
+    expires_at=models.DateTimeField(db_index=True)
 
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return f"{self.filename} ({self.received}/{self.size})"
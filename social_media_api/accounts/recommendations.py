@@ -0,0 +1,206 @@
+import heapq
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def reload_interval():
+    # Follows made in other processes only show up after a reload.
+    return getattr(settings, 'RECOMMENDATION_RELOAD_INTERVAL', 600)
+
+
+def compact_threshold():
+    return getattr(settings, 'RECOMMENDATION_COMPACT_THRESHOLD', 10000)
+
+
+def max_fanout():
+    return getattr(settings, 'RECOMMENDATION_MAX_FANOUT', 1000)
+
+
+class CSR:
+    """
+    Immutable follow adjacency in compressed sparse row form: the
+    followings of ``sources[i]`` are ``targets[offsets[i]:offsets[i + 1]]``.
+    ``sources`` is sorted so rows are found by bisection; everything lives
+    in flat ``array('q')`` buffers, 8 bytes per edge plus 16 per user.
+    """
+    def __init__(self, sources=None, offsets=None, targets=None):
+        self.sources = sources if sources is not None else array('q')
+        self.offsets = offsets if offsets is not None else array('q', [0])
+        self.targets = targets if targets is not None else array('q')
+
+    @classmethod
+    def from_sorted_edges(cls, edges):
+        """
+        Build from ``(follower_id, followee_id)`` pairs sorted by follower.
+        """
+        sources, offsets, targets = array('q'), array('q', [0]), array('q')
+        for follower_id, followee_id in edges:
+            if not sources or sources[-1] != follower_id:
+                if sources:
+                    offsets.append(len(targets))
+                sources.append(follower_id)
+            targets.append(followee_id)
+        if sources:
+            offsets.append(len(targets))
+        return cls(sources, offsets, targets)
+
+    def row(self, user_id):
+        index = bisect_left(self.sources, user_id)
+        if index == len(self.sources) or self.sources[index] != user_id:
+            return self.targets[0:0]
+        return self.targets[self.offsets[index]:self.offsets[index + 1]]
+
+    @property
+    def edges(self):
+        return len(self.targets)
+
+    @property
+    def nbytes(self):
+        return sum(buf.itemsize * len(buf) for buf in (self.sources, self.offsets, self.targets))
+
+
+class FollowGraph:
+    """
+    In-memory follow graph answering "who to follow" by friends-of-friends.
+
+    The bulk of the graph is a ``CSR`` snapshot; follows and unfollows seen
+    by this process since the snapshot sit in small per-user overlays that
+    are folded into a new snapshot once ``RECOMMENDATION_COMPACT_THRESHOLD``
+    changes pile up. The whole graph is reloaded from the database every
+    ``RECOMMENDATION_RELOAD_INTERVAL`` seconds.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._csr = None
+        self._added = defaultdict(set)
+        self._removed = defaultdict(set)
+        self._pending = 0
+        self._loaded_at = None
+        self.load_seconds = None
+
+    def load(self):
+        from .models import Follow
+
+        started = time.monotonic()
+        edges = (
+            Follow.objects.order_by('to_coustomuser', 'from_coustomuser')
+            .values_list('to_coustomuser', 'from_coustomuser')
+            .iterator(chunk_size=10000)
+        )
+        csr = CSR.from_sorted_edges(edges)
+        with self._lock:
+            self._csr = csr
+            self._added.clear()
+            self._removed.clear()
+            self._pending = 0
+            self._loaded_at = time.monotonic()
+        self.load_seconds = time.monotonic() - started
+        logger.info('Loaded follow graph: %s edges in %.2fs', csr.edges, self.load_seconds)
+
+    def ensure_loaded(self):
+        if self._csr is None or time.monotonic() - self._loaded_at > reload_interval():
+            self.load()
+
+    def invalidate(self):
+        with self._lock:
+            self._csr = None
+
+    def following(self, user_id):
+        with self._lock:
+            csr = self._csr
+            added = set(self._added.get(user_id, ()))
+            removed = set(self._removed.get(user_id, ()))
+        row = csr.row(user_id) if csr is not None else ()
+        if not added and not removed:
+            return row
+        return [target for target in row if target not in removed] + list(added - set(row))
+
+    def apply(self, follower_id, followee_ids, followed):
+        """
+        Record follows (``followed=True``) or unfollows of this process.
+        """
+        with self._lock:
+            if self._csr is None:
+                return
+            for followee_id in followee_ids:
+                if followed:
+                    self._removed[follower_id].discard(followee_id)
+                    self._added[follower_id].add(followee_id)
+                else:
+                    self._added[follower_id].discard(followee_id)
+                    self._removed[follower_id].add(followee_id)
+                self._pending += 1
+            compact = self._pending >= compact_threshold()
+        if compact:
+            self.compact()
+
+    def compact(self):
+        """
+        Fold the overlays into a fresh CSR snapshot without touching the
+        database.
+        """
+        with self._lock:
+            csr = self._csr
+            if csr is None:
+                return
+            added, removed = self._added, self._removed
+            self._added, self._removed, self._pending = defaultdict(set), defaultdict(set), 0
+            followers = sorted(set(csr.sources) | set(added) | set(removed))
+
+            def edges():
+                for follower_id in followers:
+                    row = csr.row(follower_id)
+                    if follower_id in added or follower_id in removed:
+                        gone = removed.get(follower_id, ())
+                        row = sorted({target for target in row if target not in gone} | added.get(follower_id, set()))
+                    for followee_id in row:
+                        yield follower_id, followee_id
+
+            self._csr = CSR.from_sorted_edges(edges())
+
+    def suggest(self, user_id, limit=10):
+        """
+        Up to ``limit`` ``(candidate_id, mutual_count)`` pairs: users followed
+        by the people ``user_id`` follows, ranked by how many of them do.
+        Very high-degree neighbours contribute at most
+        ``RECOMMENDATION_MAX_FANOUT`` candidates each.
+        """
+        self.ensure_loaded()
+        following = self.following(user_id)
+        exclude = set(following)
+        exclude.add(user_id)
+        fanout = max_fanout()
+        scores = Counter()
+        for followee_id in following:
+            for candidate_id in self.following(followee_id)[:fanout]:
+                if candidate_id not in exclude:
+                    scores[candidate_id] += 1
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def stats(self):
+        with self._lock:
+            csr = self._csr
+            pending = self._pending
+        if csr is None:
+            return {'loaded': False}
+        edges = csr.edges
+        return {
+            'loaded': True,
+            'users': len(csr.sources),
+            'edges': edges,
+            'pending_changes': pending,
+            'bytes': csr.nbytes,
+            'bytes_per_million_edges': round(csr.nbytes / edges * 1_000_000) if edges else None,
+            'load_seconds': self.load_seconds,
+        }
+
+
+graph = FollowGraph()
@@ -1,13 +1,82 @@
 from rest_framework import serializers
 from rest_framework.authtoken.models import Token
-from .models import CoustomUser
+from .models import CoustomUser, UploadSession
 from django.contrib.auth import get_user_model
+from . import hashing, images, uploads
+
+def picture_urls(user):
+    """
+    Thumbnail URLs by size and format, once the picture has been processed.
+    """
+    if not user.profile_picture or not user.profile_picture_processed:
+        return None
+    return images.thumbnail_urls(user.profile_picture.name)
+
 
 class UserSerializer(serializers.ModelSerializer):
+    profile_picture_urls = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CoustomUser
+        fields = [
+            'id', 'username', 'email', 'bio', 'profile_picture', 'profile_picture_urls',
+            'follower_count', 'following_count',
+        ]
+        read_only_fields = ['id', 'follower_count', 'following_count']
+
+    def get_profile_picture_urls(self, obj):
+        return picture_urls(obj)
+
+    def update(self, instance, validated_data):
+        upload = validated_data.pop('profile_picture', None)
+        fields = list(validated_data)
+        if upload is not None:
+            images.set_profile_picture(instance, upload)
+            fields += ['profile_picture', 'profile_picture_processed']
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Counters move with F() updates elsewhere; only write what changed.
+        instance.save(update_fields=fields)
+        images.schedule(instance)
+        return instance
+
+
+class FollowListSerializer(serializers.ModelSerializer):
+    """
+    A user in someone's followers/following list. ``is_following`` reads the
+    ids the viewer follows from ``context['following_ids']``.
+    """
+    is_following = serializers.SerializerMethodField()
+    profile_picture_urls = serializers.SerializerMethodField()
+
     class Meta:
         model = CoustomUser
-        fields = ['id', 'username', 'email', 'bio', 'profile_picture', 'followers']
-        read_only_fields = ['id', 'followers']
+        fields = [
+            'id', 'username', 'bio', 'profile_picture', 'profile_picture_urls',
+            'follower_count', 'following_count', 'is_following',
+        ]
+
+    def get_profile_picture_urls(self, obj):
+        return picture_urls(obj)
+
+    def get_is_following(self, obj):
+        return obj.pk in self.context.get('following_ids', ())
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'size', 'received', 'crc32', 'expires_at']
+        read_only_fields = ['id', 'received', 'crc32', 'expires_at']
+
+    def validate_size(self, value):
+        if value < 1 or value > uploads.max_size():
+            raise serializers.ValidationError(f"Uploads must be between 1 and {uploads.max_size()} bytes.")
+        return value
+
+
+class FinalizeUploadSerializer(serializers.Serializer):
+    crc32 = serializers.IntegerField(min_value=0, max_value=0xFFFFFFFF, required=False)
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -19,13 +88,18 @@ class RegisterSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
     def create(self, validated_data):
-        user = get_user_model().objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            password=validated_data['password'],
+        User = get_user_model()
+        user = User(
+            username=User.normalize_username(validated_data['username']),
+            email=User.objects.normalize_email(validated_data['email']),
             bio=validated_data.get('bio', ''),
-            profile_picture=validated_data.get('profile_picture', None)
+            # Hashed in the bounded hashing pool rather than on this worker.
+            password=hashing.make_password(validated_data['password']),
         )
+        if validated_data.get('profile_picture'):
+            images.set_profile_picture(user, validated_data['profile_picture'])
+        user.save()
+        images.schedule(user)
         Token.objects.create(user=user)
         return user
 class LoginSerializer(serializers.Serializer):
@@ -40,9 +114,10 @@ class LoginSerializer(serializers.Serializer):
             try:
                 user = CoustomUser.objects.get(username=username)
             except CoustomUser.DoesNotExist:
+                hashing.burn_password(password)
                 raise serializers.ValidationError("Invalid username or password")
 
-            if not user.check_password(password):
+            if not hashing.check_password(user, password):
                 raise serializers.ValidationError("Invalid username or password")
         else:
             raise serializers.ValidationError("Both username and password are required")
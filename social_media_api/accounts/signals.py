@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_tokens
+from .autocomplete import index as username_index
+from .models import CoustomUser
+from .recommendations import graph
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    # Covers password changes and deactivation, and keeps the cached user
+    # from serving a stale profile after edits.
+    if not created:
+        invalidate_tokens(Token.objects.filter(user=instance).values_list('key', flat=True))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def index_username(sender, instance, **kwargs):
+    user_id, username = instance.pk, instance.username
+    follower_count, is_active = instance.follower_count, instance.is_active
+    transaction.on_commit(lambda: username_index.update(user_id, username, follower_count, is_active))
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def unindex_username(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: username_index.remove(user_id))
+
+
+@receiver(m2m_changed, sender=CoustomUser.followers.through)
+def update_follow_graph(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_clear':
+        transaction.on_commit(graph.invalidate)
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+    followed = action == 'post_add'
+    if reverse:
+        # user.following.add(...): ``instance`` follows ``pk_set``.
+        transaction.on_commit(lambda: graph.apply(instance.pk, pk_set, followed))
+    else:
+        # user.followers.add(...): ``pk_set`` follow ``instance``.
+        def apply():
+            for follower_id in pk_set:
+                graph.apply(follower_id, [instance.pk], followed)
+        transaction.on_commit(apply)
@@ -1,3 +1,450 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+import zlib
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed, Throttled
+from rest_framework.test import APIClient
+
+from . import authentication, follows, hashing, images
+from .autocomplete import index as username_index
+from .recommendations import FollowGraph, graph
+from .models import CoustomUser, Follow, UploadSession
+
+
+class FollowCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = CoustomUser.objects.create_user(username='alice')
+        self.bob = CoustomUser.objects.create_user(username='bob')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def assertCounts(self, following, followers):
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual(self.alice.following_count, following)
+        self.assertEqual(self.bob.follower_count, followers)
+
+    def test_follow_counts_once(self):
+        self.assertEqual(self.client.post(f'/api/accounts/follow/{self.bob.pk}/').status_code, 200)
+        self.assertEqual(self.client.post(f'/api/accounts/follow/{self.bob.pk}/').status_code, 400)
+        self.assertCounts(1, 1)
+        self.assertTrue(self.alice.following.filter(pk=self.bob.pk).exists())
+
+    def test_follow_of_existing_row_changes_nothing(self):
+        # What a request that lost the race sees: the row is already there.
+        Follow.objects.create(from_coustomuser=self.bob, to_coustomuser=self.alice)
+        self.assertFalse(follows.follow(self.alice, self.bob))
+        self.assertCounts(0, 0)
+
+    def test_unfollow_counts_once(self):
+        follows.follow(self.alice, self.bob)
+        self.assertEqual(self.client.post(f'/api/accounts/unfollow/{self.bob.pk}/').status_code, 200)
+        self.assertEqual(self.client.post(f'/api/accounts/unfollow/{self.bob.pk}/').status_code, 400)
+        self.assertCounts(0, 0)
+        self.assertFalse(Follow.objects.exists())
+
+
+class FollowListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.bob = CoustomUser.objects.create_user(username='bob')
+        self.fans = [CoustomUser.objects.create_user(username=f'fan{i}') for i in range(5)]
+        for fan in self.fans:
+            follows.follow(fan, self.bob)
+        self.viewer = self.fans[0]
+        follows.follow(self.viewer, self.fans[3])
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def usernames(self, data):
+        return [user['username'] for user in data['results']]
+
+    def test_followers_page_newest_first(self):
+        with self.assertNumQueries(3):
+            first = self.client.get(f'/api/accounts/users/{self.bob.pk}/followers/', {'page_size': 2}).json()
+        self.assertEqual(self.usernames(first), ['fan4', 'fan3'])
+        self.assertEqual([user['is_following'] for user in first['results']], [False, True])
+        second = self.client.get(first['next']).json()
+        third = self.client.get(second['next']).json()
+        self.assertEqual(self.usernames(second) + self.usernames(third), ['fan2', 'fan1', 'fan0'])
+        self.assertIsNone(third['next'])
+
+        # Query count does not grow with the page.
+        with self.assertNumQueries(3):
+            self.client.get(f'/api/accounts/users/{self.bob.pk}/followers/', {'page_size': 5})
+
+    def test_following(self):
+        data = self.client.get(f'/api/accounts/users/{self.viewer.pk}/following/').json()
+        self.assertEqual(self.usernames(data), ['fan3', 'bob'])
+        self.assertEqual(self.client.get('/api/accounts/users/0/following/').status_code, 404)
+
+
+class SuggestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        graph.invalidate()
+        self.addCleanup(graph.invalidate)
+        self.users = {name: CoustomUser.objects.create_user(username=name) for name in 'vabcde'}
+        for follower, followee in ('va', 'vb', 'ac', 'ad', 'bc', 'be'):
+            follows.follow(self.users[follower], self.users[followee])
+        self.client = APIClient()
+        self.client.force_authenticate(self.users['v'])
+
+    def suggestions(self, **params):
+        results = self.client.get('/api/accounts/suggestions/', params).json()['results']
+        return [(user['username'], user['mutual_count']) for user in results]
+
+    def test_ranked_by_mutual_follows(self):
+        self.assertEqual(self.suggestions(), [('c', 2), ('d', 1), ('e', 1)])
+        self.assertEqual(self.suggestions(limit=1), [('c', 2)])
+
+        CoustomUser.objects.filter(pk=self.users['d'].pk).update(is_active=False)
+        self.assertEqual(self.suggestions(), [('c', 2), ('e', 1)])
+
+    def test_follows_in_this_process_apply_without_a_reload(self):
+        self.suggestions()
+        with self.captureOnCommitCallbacks(execute=True):
+            follows.follow(self.users['v'], self.users['c'])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.suggestions(), [('d', 1), ('e', 1)])
+
+    def test_compaction_matches_a_reload(self):
+        local = FollowGraph()
+        local.load()
+        local.apply(self.users['v'].pk, [self.users['c'].pk], True)
+        local.apply(self.users['a'].pk, [self.users['d'].pk], False)
+        local.compact()
+        follows.follow(self.users['v'], self.users['c'])
+        follows.unfollow(self.users['a'], self.users['d'])
+        fresh = FollowGraph()
+        fresh.load()
+        for user in self.users.values():
+            self.assertEqual(list(local.following(user.pk)), list(fresh.following(user.pk)))
+        self.assertEqual(local.stats()['pending_changes'], 0)
+
+
+class UserSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer = CoustomUser.objects.create_user(username='viewer')
+        self.alice = CoustomUser.objects.create_user(username='alice', follower_count=3)
+        self.alfred = CoustomUser.objects.create_user(username='Alfred', follower_count=1)
+        self.albert = CoustomUser.objects.create_user(username='albert', follower_count=1, is_active=False)
+        CoustomUser.objects.create_user(username='bob')
+        follows.follow(self.viewer, self.alfred)
+        username_index.load()
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def autocomplete(self, q, **params):
+        results = self.client.get('/api/accounts/users/autocomplete/', {'q': q, **params}).json()['results']
+        return [user['username'] for user in results]
+
+    def test_prefixes_rank_by_followers(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.autocomplete('AL'), ['alice', 'Alfred'])
+        self.assertEqual(self.autocomplete('alf'), ['Alfred'])
+        self.assertEqual(self.autocomplete('a', limit=1), ['alice'])
+        self.assertEqual(self.autocomplete(''), [])
+
+    def test_index_follows_renames_and_deactivation(self):
+        self.assertEqual(self.autocomplete('al'), ['alice', 'Alfred'])
+        self.alice.username = 'zoe'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice.save()
+        self.assertEqual(self.autocomplete('al'), ['Alfred'])
+        self.assertEqual(self.autocomplete('z'), ['zoe'])
+
+        self.alfred.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alfred.save()
+        self.assertEqual(self.autocomplete('al'), [])
+
+    def test_user_list_pages_active_users_by_username(self):
+        first = self.client.get('/api/accounts/users/', {'page_size': 2}).json()
+        self.assertEqual([user['username'] for user in first['results']], ['Alfred', 'alice'])
+        self.assertEqual([user['is_following'] for user in first['results']], [True, False])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([user['username'] for user in second['results']], ['bob', 'viewer'])
+        self.assertIsNone(second['next'])
+
+
+class ProfileUpdateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = CoustomUser.objects.create_user(username='alice')
+        self.bob = CoustomUser.objects.create_user(username='bob')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_stale_cached_user_does_not_overwrite_counters(self):
+        # self.alice stands in for the token-cached user: bob's follow moves
+        # the counters in the database only.
+        follows.follow(self.bob, self.alice)
+        response = self.client.patch('/api/accounts/profile/', {'bio': 'hello'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['follower_count'], 1)
+        fresh = CoustomUser.objects.get(pk=self.alice.pk)
+        self.assertEqual((fresh.bio, fresh.follower_count), ('hello', 1))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CoustomUser.objects.create_user(username='alice')
+        self.token = Token.objects.create(user=self.user)
+        self.auth = authentication.CachedTokenAuthentication()
+
+    def test_repeat_lookups_skip_the_database(self):
+        user, _ = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+        with self.assertNumQueries(0):
+            again, _ = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(again, self.user)
+        # Views get their own instance to modify.
+        self.assertIsNot(again, user)
+
+        authentication.local_cache.delete(authentication.digest(self.token.key))
+        before = authentication.get_stats()['shared_hits']
+        self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(authentication.get_stats()['shared_hits'], before + 1)
+
+    def test_deactivation_is_seen_at_once(self):
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_deleted_token_is_rejected(self):
+        key = self.token.key
+        self.auth.authenticate_credentials(key)
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(key)
+
+    def test_request_with_token_header(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(client.get('/api/accounts/profile/').status_code, 200)
+        client.credentials(HTTP_AUTHORIZATION='Token nope')
+        self.assertEqual(client.get('/api/accounts/profile/').status_code, 401)
+
+
+class LocalTokenCacheTests(SimpleTestCase):
+    def test_lru_and_ttl(self):
+        local = authentication.LocalTokenCache(max_size=2, ttl=60)
+        local.set('a', 1)
+        local.set('b', 2)
+        local.get('a')
+        local.set('c', 3)
+        self.assertEqual((local.get('a'), local.get('b'), local.get('c')), (1, None, 3))
+
+        expired = authentication.LocalTokenCache(max_size=2, ttl=-1)
+        expired.set('a', 1)
+        self.assertIsNone(expired.get('a'))
+        self.assertEqual(len(expired), 0)
+
+
+@override_settings(PASSWORD_HASH_POOL=True, PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE_DEPTH=0)
+class HashingPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = hashing.HashingPool()
+        self.addCleanup(lambda: self.pool._executor and self.pool._executor.shutdown(cancel_futures=True))
+
+    def test_timeout_is_unavailable_and_keeps_the_slot_until_done(self):
+        with override_settings(PASSWORD_HASH_TIMEOUT=0.1):
+            with self.assertRaises(hashing.HashingUnavailable):
+                self.pool.run(time.sleep, 1)
+            # The timed-out job still runs in the only worker.
+            with self.assertRaises(Throttled):
+                self.pool.run(abs, -1)
+        # Worker start-up time varies, so wait for the slot instead of a
+        # fixed interval.
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                self.assertEqual(self.pool.run(abs, -1), 1)
+                break
+            except Throttled:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.05)
+
+
+@override_settings(PASSWORD_HASH_POOL=True, PASSWORD_HASH_WORKERS=1)
+class PasswordEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        pool = hashing.HashingPool()
+        self.addCleanup(lambda: pool._executor and pool._executor.shutdown(cancel_futures=True))
+        patcher = mock.patch.object(hashing, 'pool', pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def login(self, username, password):
+        return self.client.post('/api/accounts/login/', {'username': username, 'password': password}, format='json')
+
+    def test_register_and_login_hash_in_the_pool(self):
+        response = self.client.post(
+            '/api/accounts/register/',
+            {'username': 'alice', 'email': 'alice@example.com', 'password': 's3cret-pass'}, format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        token = response.json()['token']
+        self.assertTrue(CoustomUser.objects.get(username='alice').check_password('s3cret-pass'))
+        self.assertIsNotNone(hashing.pool._executor)
+
+        response = self.login('alice', 's3cret-pass')
+        self.assertEqual((response.status_code, response.json()['token']), (200, token))
+        self.assertEqual(self.login('alice', 'wrong').status_code, 400)
+        self.assertEqual(self.login('nobody', 's3cret-pass').status_code, 400)
+
+    def test_full_pool_refuses_logins(self):
+        CoustomUser.objects.create_user(username='alice', password='s3cret-pass')
+        with mock.patch.object(hashing.pool, 'run', side_effect=Throttled(wait=1)):
+            self.assertEqual(self.login('alice', 's3cret-pass').status_code, 429)
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(
+            MEDIA_ROOT=self.media, CHUNKED_UPLOAD_DIR=f'{self.media}/parts', CHUNKED_UPLOAD_CHUNK_SIZE=1024,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        buffer = BytesIO()
+        Image.effect_noise((64, 64), 64).save(buffer, 'PNG')
+        self.data = buffer.getvalue()
+        self.user = CoustomUser.objects.create_user(username='alice')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/accounts/uploads/', {'filename': 'me.png', 'size': len(self.data)}, format='json')
+        self.assertEqual(response.json()['chunk_size'], 1024)
+        self.url = f"/api/accounts/uploads/{response.json()['id']}/"
+
+    def put(self, start, end, body=None):
+        return self.client.put(
+            self.url, self.data[start:end + 1] if body is None else body,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.data)}',
+        )
+
+    def upload(self):
+        for start in range(0, len(self.data), 1024):
+            self.assertEqual(self.put(start, min(start + 1023, len(self.data) - 1)).status_code, 200)
+
+    def test_resume_from_received(self):
+        self.assertEqual(self.put(0, 1023).status_code, 200)
+        self.assertEqual(self.put(0, 1023).json()['received'], 1024)  # retried chunk
+        response = self.put(2048, 3071)
+        self.assertEqual((response.status_code, response.json()['received']), (409, 1024))
+        self.assertEqual(self.client.get(self.url).json()['received'], 1024)
+
+    def test_rejects_oversized_and_empty_chunks(self):
+        self.assertEqual(self.put(0, 1024).status_code, 400)
+        self.assertEqual(self.put(0, 1023, body=b'').status_code, 400)
+        self.assertEqual(self.client.get(self.url).json()['received'], 0)
+
+    def test_crc_mismatch_discards_upload(self):
+        self.upload()
+        response = self.client.post(f'{self.url}finalize/', {'crc32': (zlib.crc32(self.data) + 1) % 2 ** 32}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_finalize_sets_profile_picture(self):
+        self.assertEqual(self.client.post(f'{self.url}finalize/', {}, format='json').status_code, 409)
+        self.upload()
+        self.assertEqual(self.client.get(self.url).json()['crc32'], zlib.crc32(self.data))
+        response = self.client.post(f'{self.url}finalize/', {'crc32': zlib.crc32(self.data)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        with self.user.profile_picture.open('rb') as picture:
+            self.assertEqual(picture.read(), self.data)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(self.client.post(f'{self.url}finalize/', {}, format='json').status_code, 404)
+
+
+class ProfilePictureTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media, PROFILE_PICTURE_SIZES={'small': 16, 'large': 48})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        image = Image.new('RGBA', (120, 80), (200, 30, 30, 255))
+        image.putpixel((60, 40), (0, 0, 0, 0))
+        buffer = BytesIO()
+        image.save(buffer, 'PNG')
+        self.data = buffer.getvalue()
+        self.user = CoustomUser.objects.create_user(username='alice')
+
+    def upload(self, name='me.png'):
+        return SimpleUploadedFile(name, self.data, content_type='image/png')
+
+    def test_identical_uploads_share_one_file(self):
+        first = images.store_original(self.upload('me.png'))
+        second = images.store_original(self.upload('Copy of me.PNG'))
+        self.assertEqual(first, second)
+        self.assertTrue(first.endswith('.png'))
+        originals = [files for _, _, files in os.walk(os.path.join(self.media, images.ORIGINALS_DIR)) if files]
+        self.assertEqual(originals, [[os.path.basename(first)]])
+
+    @mock.patch.object(images, 'close_old_connections')
+    def test_thumbnails_for_every_size_and_format(self, _):
+        images.set_profile_picture(self.user, self.upload())
+        self.user.save()
+        name = self.user.profile_picture.name
+        images.process(self.user.pk, name)
+
+        digest = images.digest_of(name)
+        for size, pixels in (('small', 16), ('large', 48)):
+            for fmt, mode in (('webp', 'RGBA'), ('jpeg', 'RGB')):
+                with default_storage.open(images.thumbnail_name(digest, size, fmt), 'rb') as thumbnail:
+                    image = Image.open(thumbnail)
+                    self.assertEqual((image.size, image.mode), ((pixels, pixels), mode))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.profile_picture_processed)
+
+    @mock.patch.object(images, 'close_old_connections')
+    def test_replaced_picture_is_not_flagged(self, _):
+        images.set_profile_picture(self.user, self.upload())
+        self.user.save()
+        old = self.user.profile_picture.name
+        CoustomUser.objects.filter(pk=self.user.pk).update(profile_picture='profile_pics/other.png')
+        images.process(self.user.pk, old)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.profile_picture_processed)
+
+    def test_profile_upload_schedules_thumbnails_after_commit(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch.object(images.pool, 'submit') as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.patch('/api/accounts/profile/', {'profile_picture': self.upload()}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['profile_picture_urls'])
+        self.user.refresh_from_db()
+        submit.assert_called_once_with(self.user.pk, self.user.profile_picture.name)
+
+        CoustomUser.objects.filter(pk=self.user.pk).update(profile_picture_processed=True)
+        urls = client.get('/api/accounts/profile/').json()['profile_picture_urls']
+        self.assertEqual(set(urls), {'small', 'large'})
+        self.assertEqual(set(urls['small']), set(images.FORMATS))
@@ -0,0 +1,92 @@
+import os
+import re
+import tempfile
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class RangeError(Exception):
+    """
+    A chunk that does not continue the upload where it left off.
+    """
+
+
+def upload_dir():
+    return getattr(settings, 'CHUNKED_UPLOAD_DIR', None) or os.path.join(tempfile.gettempdir(), 'chunked_uploads')
+
+
+def max_size():
+    return getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 20 * 1024 * 1024)
+
+
+def chunk_size():
+    # Largest byte range a single PUT may carry.
+    return getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', 1024 * 1024)
+
+
+def expires_at():
+    return timezone.now() + timedelta(seconds=getattr(settings, 'CHUNKED_UPLOAD_EXPIRY', 24 * 3600))
+
+
+def part_path(session):
+    return os.path.join(upload_dir(), f'{session.pk}.part')
+
+
+def parse_content_range(value):
+    """
+    ``(start, end, total)`` from ``Content-Range: bytes start-end/total``,
+    or ``None``.
+    """
+    match = CONTENT_RANGE_RE.match(value or '')
+    if not match:
+        return None
+    start, end, total = map(int, match.groups())
+    if start > end or end >= total:
+        return None
+    return start, end, total
+
+
+def write_chunk(session, stream, start, end):
+    """
+    Copy ``end - start + 1`` bytes from ``stream`` to ``start`` in the part
+    file without holding more than one buffer in memory, extending the
+    running CRC32. Updates ``session`` in place; the caller saves it.
+    """
+    if start != session.received:
+        raise RangeError(f'Expected a chunk starting at byte {session.received}.')
+    os.makedirs(upload_dir(), exist_ok=True)
+    remaining = end - start + 1
+    crc = session.crc32
+    fd = os.open(part_path(session), os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        offset = start
+        while remaining:
+            data = stream.read(min(COPY_BUFFER_SIZE, remaining))
+            if not data:
+                break
+            os.pwrite(fd, data, offset)
+            crc = zlib.crc32(data, crc)
+            offset += len(data)
+            remaining -= len(data)
+    finally:
+        os.close(fd)
+    if remaining:
+        # Short body: leave the session where it was so the chunk can be
+        # sent again; the stray tail is overwritten by the retry.
+        raise RangeError(f'Chunk body is {remaining} bytes shorter than its Content-Range.')
+    session.received = end + 1
+    session.crc32 = crc
+    session.expires_at = expires_at()
+
+
+def discard(session):
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
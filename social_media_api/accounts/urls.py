@@ -1,8 +1,20 @@
 from django.urls import path
-from .views import RegisterView, LoginView, ProfileView
+from .views import RegisterView, LoginView, ProfileView, FollowUserView, UnfollowUserView, AuthCacheStatsView, FollowersView, FollowingView, SuggestionsView, SuggestionsStatsView, UserListView, UserAutocompleteView, UploadSessionCreateView, UploadSessionView, UploadFinalizeView
 
 urlpatterns=[
     path('register/',RegisterView.as_view(),name='register'),
     path('login/',LoginView.as_view(),name='login'),
     path('profile/',ProfileView.as_view(),name='profile'),
+    path('follow/<int:user_id>/', FollowUserView.as_view(), name='follow-user'),
+    path('unfollow/<int:user_id>/', UnfollowUserView.as_view(), name='unfollow-user'),
+    path('users/', UserListView.as_view(), name='user-list'),
+    path('users/autocomplete/', UserAutocompleteView.as_view(), name='user-autocomplete'),
+    path('users/<int:user_id>/followers/', FollowersView.as_view(), name='user-followers'),
+    path('users/<int:user_id>/following/', FollowingView.as_view(), name='user-following'),
+    path('suggestions/', SuggestionsView.as_view(), name='follow-suggestions'),
+    path('suggestions/stats/', SuggestionsStatsView.as_view(), name='follow-suggestions-stats'),
+    path('uploads/', UploadSessionCreateView.as_view(), name='upload-create'),
+    path('uploads/<uuid:session_id>/', UploadSessionView.as_view(), name='upload-session'),
+    path('uploads/<uuid:session_id>/finalize/', UploadFinalizeView.as_view(), name='upload-finalize'),
+    path('auth-cache/', AuthCacheStatsView.as_view(), name='auth-cache-stats'),
 ]
\ No newline at end of file
@@ -1,9 +1,21 @@
 from django.shortcuts import render
-from .models import CoustomUser
-from .serializers import RegisterSerializer, LoginSerializer, UserSerializer
+from django.db import transaction
+from django.core.files import File
+from django.utils import timezone
+from PIL import Image
+from .authentication import CachedTokenAuthentication, get_stats
+from .models import CoustomUser, Follow, UploadSession
+from .autocomplete import index as username_index
+from .recommendations import graph
+from .serializers import RegisterSerializer, LoginSerializer, UserSerializer, FollowListSerializer, UploadSessionSerializer, FinalizeUploadSerializer
+from . import autocomplete, follows, images, uploads
 from rest_framework.views import APIView
+from rest_framework.authtoken.models import Token
 from rest_framework import generics, response, status, permissions
-from rest_framework.authentication import TokenAuthentication
+from django.conf import settings
+from notifications import outbox
+from posts.feed import backfill_timeline, remove_from_timeline
+from posts.pagination import KeysetPagination, parse_limit
 # Create your views here.
 class RegisterView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
@@ -21,17 +33,317 @@ class LoginView(APIView):
     def post(self, request):
         ser = LoginSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
-        return response.Response(ser.validated_data, status=status.HTTP_200_OK)
+        user = ser.validated_data['user']
+        token, _ = Token.objects.get_or_create(user=user)
+        return response.Response(
+            {'user': UserSerializer(user, context={'request': request}).data, 'token': token.key},
+            status=status.HTTP_200_OK
+        )
 
 class ProfileView(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        return response.Response(UserSerializer(request.user, context={'request': request}).data)
+        # request.user may come from the token cache; counters are kept
+        # with F() updates that do not refresh it.
+        user = CoustomUser.objects.get(pk=request.user.pk)
+        return response.Response(UserSerializer(user, context={'request': request}).data)
 
     def patch(self, request):
-        ser = UserSerializer(request.user, data=request.data, partial=True)
+        # Save a fresh copy: the cached request.user would write back stale
+        # counters and picture state.
+        user = CoustomUser.objects.get(pk=request.user.pk)
+        ser = UserSerializer(user, data=request.data, partial=True)
         ser.is_valid(raise_exception=True)
         ser.save()
-        return response.Response(ser.data)
\ No newline at end of file
+        return response.Response(ser.data)
+
+class FollowUserView(generics.GenericAPIView):
+    """
+    API view to allow a user to follow another user.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [CachedTokenAuthentication]
+    queryset = CoustomUser.objects.all()
+    lookup_url_kwarg = 'user_id'
+
+    def post(self, request, *args, **kwargs):
+        user_to_follow = self.get_object()
+        user = request.user
+
+        if user == user_to_follow:
+            return response.Response({"error": "You cannot follow yourself."}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            if not follows.follow(user, user_to_follow):
+                return response.Response({"error": "You are already following this user."}, status=status.HTTP_400_BAD_REQUEST)
+            backfill_timeline(user, user_to_follow)
+            outbox.notify('follow', [(user_to_follow.pk, user.pk, user.pk)])
+        return response.Response({"detail": f"Successfully followed {user_to_follow.username}."}, status=status.HTTP_200_OK)
+
+class UnfollowUserView(generics.GenericAPIView):
+    """
+    API view to allow a user to unfollow another user.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [CachedTokenAuthentication]
+    queryset = CoustomUser.objects.all()
+    lookup_url_kwarg = 'user_id'
+
+    def post(self, request, *args, **kwargs):
+        user_to_unfollow = self.get_object()
+        user = request.user
+
+        with transaction.atomic():
+            if not follows.unfollow(user, user_to_unfollow):
+                return response.Response({"error": "You are not following this user."}, status=status.HTTP_400_BAD_REQUEST)
+            remove_from_timeline(user, user_to_unfollow)
+        return response.Response({"detail": f"Successfully unfollowed {user_to_unfollow.username}."}, status=status.HTTP_200_OK)
+
+
+class AuthCacheStatsView(APIView):
+    """
+    Hit rate of this process's token authentication cache.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return response.Response(get_stats())
+
+
+def following_ids(viewer, users):
+    """
+    Ids among ``users`` that ``viewer`` follows, in one query.
+    """
+    return set(
+        Follow.objects.filter(to_coustomuser=viewer, from_coustomuser__in=users)
+        .values_list('from_coustomuser', flat=True)
+    )
+
+
+class FollowListView(generics.ListAPIView):
+    """
+    Keyset-paginated followers (or followings) of a user, most recent first,
+    each flagged with whether the current user follows them.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [CachedTokenAuthentication]
+    serializer_class = FollowListSerializer
+    pagination_class = KeysetPagination
+    # Follow column holding the listed users; the other one is the user
+    # whose list it is.
+    listed_field = 'to_coustomuser'
+    owner_field = 'from_coustomuser'
+
+    def get_queryset(self):
+        owner = generics.get_object_or_404(CoustomUser, pk=self.kwargs['user_id'])
+        return (
+            Follow.objects.filter(**{self.owner_field: owner})
+            .select_related(self.listed_field)
+            .order_by('-id')
+        )
+
+    def list(self, request, *args, **kwargs):
+        rows = self.paginate_queryset(self.get_queryset())
+        users = [getattr(row, self.listed_field) for row in rows]
+        serializer = self.get_serializer(users, many=True, context={
+            **self.get_serializer_context(), 'following_ids': following_ids(request.user, users),
+        })
+        return self.get_paginated_response(serializer.data)
+
+
+class FollowersView(FollowListView):
+    listed_field = 'to_coustomuser'
+    owner_field = 'from_coustomuser'
+
+
+class FollowingView(FollowListView):
+    listed_field = 'from_coustomuser'
+    owner_field = 'to_coustomuser'
+
+
+class SuggestionsView(generics.GenericAPIView):
+    """
+    "Who to follow": users followed by the people the current user follows,
+    ranked by how many of them do (``mutual_count``).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [CachedTokenAuthentication]
+    serializer_class = FollowListSerializer
+
+    def get(self, request):
+        limit = parse_limit(request, 10, getattr(settings, 'RECOMMENDATION_MAX_RESULTS', 50))
+
+        ranked = graph.suggest(request.user.pk, limit)
+        users = CoustomUser.objects.filter(is_active=True).in_bulk([user_id for user_id, _ in ranked])
+        results = []
+        for user_id, mutual_count in ranked:
+            if user_id in users:
+                data = self.get_serializer(users[user_id]).data
+                data['mutual_count'] = mutual_count
+                results.append(data)
+        return response.Response({'results': results})
+
+
+class SuggestionsStatsView(APIView):
+    """
+    Size and memory footprint of this process's in-memory follow graph.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return response.Response(graph.stats())
+
+
+class UserListView(generics.ListAPIView):
+    """
+    API view to list users, keyset-paginated by username.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [CachedTokenAuthentication]
+    serializer_class = FollowListSerializer
+    pagination_class = KeysetPagination
+    queryset = CoustomUser.objects.filter(is_active=True).order_by('username')
+
+    def list(self, request, *args, **kwargs):
+        users = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(users, many=True, context={
+            **self.get_serializer_context(), 'following_ids': following_ids(request.user, users),
+        })
+        return self.get_paginated_response(serializer.data)
+
+
+class UserAutocompleteView(APIView):
+    """
+    Usernames starting with ``?q=``, most followed first, answered from the
+    in-memory username index.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [CachedTokenAuthentication]
+
+    def get(self, request):
+        limit = parse_limit(request, 10, autocomplete.max_results())
+        matches = username_index.search(request.query_params.get('q', '').strip(), limit)
+        return response.Response({'results': [
+            {'id': user_id, 'username': username, 'follower_count': follower_count}
+            for user_id, username, follower_count in matches
+        ]})
+
+
+class UploadSessionCreateView(generics.CreateAPIView):
+    """
+    Start a resumable upload: declare ``filename`` and ``size``, then PUT
+    byte ranges to the returned session and finalize it.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [CachedTokenAuthentication]
+    serializer_class = UploadSessionSerializer
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user, expires_at=uploads.expires_at())
+
+    def create(self, request, *args, **kwargs):
+        res = super().create(request, *args, **kwargs)
+        res.data['chunk_size'] = uploads.chunk_size()
+        return res
+
+
+class UploadSessionView(APIView):
+    """
+    ``GET`` reports how many bytes have been received (where to resume),
+    ``PUT`` appends the byte range given by ``Content-Range`` and
+    ``DELETE`` abandons the upload.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [CachedTokenAuthentication]
+
+    def get_session(self, request, session_id, lock=False):
+        queryset = UploadSession.objects.filter(user=request.user, expires_at__gt=timezone.now())
+        if lock:
+            queryset = queryset.select_for_update()
+        return generics.get_object_or_404(queryset, pk=session_id)
+
+    def get(self, request, session_id):
+        return response.Response(UploadSessionSerializer(self.get_session(request, session_id)).data)
+
+    def put(self, request, session_id):
+        content_range = uploads.parse_content_range(request.headers.get('Content-Range'))
+        if content_range is None:
+            return response.Response(
+                {"error": "A Content-Range: bytes start-end/total header is required."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        start, end, total = content_range
+        if end - start + 1 > uploads.chunk_size():
+            return response.Response(
+                {"error": f"Chunks may be at most {uploads.chunk_size()} bytes."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if request.stream is None:
+            return response.Response({"error": "The chunk body is empty."}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            session = self.get_session(request, session_id, lock=True)
+            if total != session.size:
+                return response.Response(
+                    {"error": f"Upload size is {session.size} bytes."}, status=status.HTTP_400_BAD_REQUEST
+                )
+            if end < session.received:
+                # A retry of a chunk that already arrived.
+                return response.Response(UploadSessionSerializer(session).data)
+            try:
+                uploads.write_chunk(session, request.stream, start, end)
+            except uploads.RangeError as exc:
+                return response.Response(
+                    {"error": str(exc), **UploadSessionSerializer(session).data}, status=status.HTTP_409_CONFLICT
+                )
+            session.save(update_fields=['received', 'crc32', 'expires_at'])
+        return response.Response(UploadSessionSerializer(session).data)
+
+    def delete(self, request, session_id):
+        with transaction.atomic():
+            session = self.get_session(request, session_id, lock=True)
+            uploads.discard(session)
+            session.delete()
+        return response.Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadFinalizeView(UploadSessionView):
+    """
+    Check a complete upload against the client's CRC32 and make it the
+    current user's profile picture.
+    """
+    def post(self, request, session_id):
+        ser = FinalizeUploadSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        # Locked for the whole finalize so a concurrent finalize or DELETE
+        # cannot remove the part file while it is being read.
+        with transaction.atomic():
+            session = self.get_session(request, session_id, lock=True)
+            if session.received != session.size:
+                return response.Response(
+                    {"error": f"Only {session.received} of {session.size} bytes received."},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if 'crc32' in ser.validated_data and ser.validated_data['crc32'] != session.crc32:
+                uploads.discard(session)
+                session.delete()
+                return response.Response({"error": "Checksum mismatch, upload discarded."}, status=status.HTTP_400_BAD_REQUEST)
+
+            path = uploads.part_path(session)
+            try:
+                with Image.open(path) as image:
+                    image.verify()
+            except Exception:
+                uploads.discard(session)
+                session.delete()
+                return response.Response({"error": "Upload is not a valid image."}, status=status.HTTP_400_BAD_REQUEST)
+
+            user = CoustomUser.objects.get(pk=request.user.pk)
+            with open(path, 'rb') as part:
+                images.set_profile_picture(user, File(part, name=session.filename))
+                user.save(update_fields=['profile_picture', 'profile_picture_processed'])
+            uploads.discard(session)
+            session.delete()
+            images.schedule(user)
+        return response.Response(UserSerializer(user, context={'request': request}).data)
@@ -0,0 +1,124 @@
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from notifications.models import Notification
+from notifications.unread import reset_unread
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete notifications older than the retention age and beyond the '
+        'per-recipient cap, in bounded batches, optionally archiving them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-days', type=int,
+                            default=getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90))
+        parser.add_argument('--max-per-recipient', type=int,
+                            default=getattr(settings, 'NOTIFICATION_MAX_PER_RECIPIENT', 1000))
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--time-budget', type=float, default=None,
+                            help='Stop after this many seconds; the next run picks up the rest.')
+        parser.add_argument('--archive-dir', default=None,
+                            help='Append pruned rows to a gzipped NDJSON file in this directory.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        self.started = time.monotonic()
+        self.deadline = self.started + options['time_budget'] if options['time_budget'] else None
+        self.deleted = 0
+        self.counted = set()
+        self.recipients = set()
+        self.archive = None
+        if options['archive_dir'] and not self.dry_run:
+            os.makedirs(options['archive_dir'], exist_ok=True)
+            name = f"notifications-{timezone.now():%Y%m%dT%H%M%S}.ndjson.gz"
+            self.archive = gzip.open(os.path.join(options['archive_dir'], name), 'at', encoding='utf-8')
+
+        try:
+            if options['max_age_days']:
+                cutoff = timezone.now() - timedelta(days=options['max_age_days'])
+                self.prune(lambda: Notification.objects.filter(timestamp__lt=cutoff).order_by('id'))
+            if options['max_per_recipient'] and not self.out_of_time():
+                self.prune_per_recipient(options['max_per_recipient'])
+        finally:
+            if self.archive is not None:
+                self.archive.close()
+            if self.recipients and not self.dry_run:
+                reset_unread(self.recipients)
+
+        elapsed = time.monotonic() - self.started
+        rate = self.deleted / elapsed if elapsed else 0
+        verb = 'Would delete' if self.dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {self.deleted} notifications in {elapsed:.1f}s ({rate:.0f} rows/s).'
+        ))
+        if self.out_of_time():
+            self.stdout.write(self.style.WARNING('Time budget reached; rerun to continue.'))
+
+    def out_of_time(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def prune_per_recipient(self, keep):
+        over = (
+            Notification.objects.values('recipient_id')
+            .annotate(total=Count('id'))
+            .filter(total__gt=keep)
+            .values_list('recipient_id', flat=True)
+        )
+        for recipient_id in list(over):
+            if self.out_of_time():
+                return
+            # Everything past the newest ``keep`` rows, walked on the
+            # (recipient, -timestamp, -id) index.
+            self.prune(
+                lambda: Notification.objects.filter(recipient_id=recipient_id)
+                .order_by('-timestamp', '-id')[keep:],
+                offset_scan=True,
+            )
+
+    def prune(self, candidates, offset_scan=False):
+        """
+        Delete ``candidates()`` a batch at a time, each batch in its own
+        short transaction.
+        """
+        skip = 0
+        while not self.out_of_time():
+            queryset = candidates()
+            if offset_scan:
+                # A dry run deletes nothing, so step past what it has seen.
+                queryset = queryset[skip:skip + self.batch_size]
+            else:
+                queryset = queryset.filter(id__gt=skip)[:self.batch_size]
+            rows = list(queryset.values(
+                'id', 'recipient_id', 'actor_id', 'verb', 'target_content_type_id',
+                'target_object_id', 'timestamp', 'read', 'actor_count', 'latest_actors',
+            ))
+            if not rows:
+                return
+            if self.dry_run:
+                skip = skip + len(rows) if offset_scan else rows[-1]['id']
+                # Rows a dry run counted by age are still there for the
+                # per-recipient pass to find again.
+                self.deleted += sum(row['id'] not in self.counted for row in rows)
+                self.counted.update(row['id'] for row in rows)
+                continue
+            self.deleted += len(rows)
+            self.recipients.update(row['recipient_id'] for row in rows if not row['read'])
+            if self.archive is not None:
+                for row in rows:
+                    self.archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+            with transaction.atomic():
+                Notification.objects.filter(id__in=[row['id'] for row in rows]).delete()
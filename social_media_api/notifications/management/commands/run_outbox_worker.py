@@ -0,0 +1,61 @@
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from notifications import outbox
+
+
+class Command(BaseCommand):
+    help = 'Drain the outbox (notifications, feed fan-out and trending scores) with a pool of worker threads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds an idle worker sleeps before polling again.')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the outbox has no due events.')
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.delivered = self.failed = 0
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.stop.set())
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['threads'], thread_name_prefix='outbox') as pool:
+            futures = [
+                pool.submit(self.work, options['batch_size'], options['poll_interval'], options['once'])
+                for _ in range(options['threads'])
+            ]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                self.stop.set()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Delivered {self.delivered} events, {self.failed} failed, in {elapsed:.1f}s.'
+        ))
+
+    def work(self, batch_size, poll_interval, once):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                delivered, failed = outbox.drain_once(batch_size)
+                with self.lock:
+                    self.delivered += delivered
+                    self.failed += failed
+                if delivered or failed:
+                    continue
+                if once:
+                    break
+                self.stop.wait(poll_interval)
+        finally:
+            connection.close()
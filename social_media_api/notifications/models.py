@@ -3,6 +3,7 @@ from django.db import models
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
 
 class Notification(models.Model):
     recipient = models.ForeignKey(
@@ -17,6 +18,63 @@ class Notification(models.Model):
     target = GenericForeignKey('target_content_type', 'target_object_id')
     timestamp = models.DateTimeField(auto_now_add=True)
     read = models.BooleanField(default=False)
+    # Aggregation: ``actor`` is the most recent actor, ``latest_actors`` the
+    # ids of the most recent few, newest first.
+    actor_count = models.PositiveIntegerField(default=1)
+    latest_actors = models.JSONField(default=list)
+    # Position in the recipient's stream, taken from ``NotificationSequence``
+    # whenever the row is created or re-aggregated.
+    sequence = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', '-timestamp', '-id'], name='notif_recipient_ts_idx'),
+            models.Index(fields=['target_content_type', 'target_object_id'], name='notif_target_idx'),
+            models.Index(fields=['recipient', 'id'], condition=models.Q(read=False), name='notif_unread_idx'),
+            models.Index(fields=['recipient', 'sequence'], name='notif_recipient_seq_idx'),
+        ]
 
     def __str__(self):
         return f"{self.actor} {self.verb} {self.target}"
+
+
+class NotificationSequence(models.Model):
+    """
+    Per-recipient counter handing out ``Notification.sequence`` values. The
+    row stays locked from the increment until the writing transaction
+    commits, so a recipient's sequence numbers become visible in order.
+    """
+    recipient = models.OneToOneField(
+        settings.AUTH_USER_MODEL, primary_key=True, related_name='+', on_delete=models.CASCADE
+    )
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.recipient_id}: {self.value}"
+
+
+class OutboxEvent(models.Model):
+    """
+    Pending side effect (a notification or an ``outbox.TASKS`` job such as
+    feed fan-out), written in the same transaction as the action that caused
+    it and drained by ``run_outbox_worker``. ``payload`` holds
+    ``{"rows": [...]}``; for notifications each row is
+    ``[recipient_id, actor_id, target_id]``, for ``batch`` events each row
+    is a ``[kind, rows]`` part.
+    """
+    kind = models.CharField(max_length=32)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    # Next time the event may be claimed; NULL once it has exhausted its
+    # retries and is left for inspection.
+    available_at = models.DateTimeField(null=True, default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='outbox_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} event #{self.pk}"
@@ -0,0 +1,197 @@
+import logging
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent
+from .services import notify_many
+
+logger = logging.getLogger(__name__)
+
+# kind -> (notification verb, target model)
+KINDS = {
+    'like': ('liked your post', 'posts.Post'),
+    'comment': ('commented on your post', 'posts.Post'),
+    'follow': ('started following you', 'accounts.CoustomUser'),
+    'mention': ('mentioned you in a post', 'posts.Post'),
+    'comment_mention': ('mentioned you in a comment', 'posts.Post'),
+}
+
+# kind -> callable taking the event rows, for work other than notifications
+# that should also leave the request and survive a crash.
+TASKS = {
+    'fanout': 'posts.feed.fan_out_posts',
+    'trending': 'posts.trending.apply_post_events',
+    'trending_tags': 'posts.trending.apply_tag_events',
+}
+# Kind of events bundling ``[kind, rows]`` parts; see ``enqueue_many``.
+BATCH = 'batch'
+
+def outbox_enabled():
+    return getattr(settings, 'NOTIFICATION_OUTBOX', False)
+
+
+def batch_size():
+    return getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+
+
+def max_attempts():
+    return getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8)
+
+
+def lease_seconds():
+    return getattr(settings, 'OUTBOX_LEASE', 60)
+
+
+def backoff(attempts):
+    """
+    Exponential backoff with full jitter, capped at ``OUTBOX_BACKOFF_MAX``.
+    """
+    base = getattr(settings, 'OUTBOX_BACKOFF_BASE', 2.0)
+    cap = getattr(settings, 'OUTBOX_BACKOFF_MAX', 600.0)
+    return random.uniform(0, min(cap, base * 2 ** (attempts - 1)))
+
+
+def deliver(kind, rows):
+    if kind == BATCH:
+        parts = defaultdict(list)
+        for part_kind, part_rows in rows:
+            parts[part_kind].extend(part_rows)
+        for part_kind, part_rows in parts.items():
+            deliver(part_kind, part_rows)
+        return None
+    if kind in TASKS:
+        return import_string(TASKS[kind])(rows)
+    verb, target_model = KINDS[kind]
+    return notify_many(verb, apps.get_model(target_model), rows)
+
+
+def enqueue(kind, rows):
+    """
+    Record ``rows`` for ``kind``. With ``NOTIFICATION_OUTBOX`` on this is a
+    single insert into the outbox, committed with the caller's transaction;
+    otherwise ``rows`` are delivered right away.
+    """
+    if not outbox_enabled():
+        return deliver(kind, rows)
+    return OutboxEvent.objects.create(kind=kind, payload={'rows': rows})
+
+
+def enqueue_many(parts):
+    """
+    Record several ``(kind, rows)`` parts of one action with a single
+    outbox insert; parts without rows are dropped.
+    """
+    parts = [[kind, rows] for kind, rows in parts if rows]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return enqueue(*parts[0])
+    return enqueue(BATCH, parts)
+
+
+def notification_rows(rows):
+    """
+    ``(recipient_id, actor_id, target_id)`` rows as stored in the outbox,
+    without the actor's own actions.
+    """
+    return [[recipient_id, actor_id, target_id] for recipient_id, actor_id, target_id in rows
+            if recipient_id != actor_id]
+
+
+def notify(kind, rows):
+    """
+    Record that ``(recipient_id, actor_id, target_id)`` rows of ``kind``
+    should be notified; see ``enqueue``.
+    """
+    return enqueue_many([(kind, notification_rows(rows))])
+
+
+def claim(limit):
+    """
+    Lease up to ``limit`` due events so concurrent workers skip them until
+    the lease runs out. The lease is taken with one conditional
+    ``UPDATE ... WHERE available_at <= now``, so of two workers picking the
+    same candidates only the first to write gets each row; this does not
+    rely on row locks, which SQLite lacks.
+    """
+    now = timezone.now()
+    candidates = list(
+        OutboxEvent.objects.filter(available_at__lte=now)
+        .order_by('available_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if not candidates:
+        return []
+    lease = now + timedelta(seconds=lease_seconds())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE {table} SET available_at = %s WHERE id IN ({ids}) AND available_at <= %s RETURNING id'.format(
+                table=OutboxEvent._meta.db_table,
+                ids=', '.join(['%s'] * len(candidates)),
+            ),
+            [connection.ops.adapt_datetimefield_value(lease), *candidates,
+             connection.ops.adapt_datetimefield_value(now)],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    return list(OutboxEvent.objects.filter(id__in=ids).order_by('id'))
+
+
+def _fail(event, exc):
+    event.attempts += 1
+    event.last_error = f'{type(exc).__name__}: {exc}'
+    if event.attempts >= max_attempts():
+        event.available_at = None
+        logger.error('Outbox event %s gave up after %s attempts: %s', event.pk, event.attempts, event.last_error)
+    else:
+        event.available_at = timezone.now() + timedelta(seconds=backoff(event.attempts))
+        logger.warning('Outbox event %s failed (attempt %s): %s', event.pk, event.attempts, event.last_error)
+    event.save(update_fields=['attempts', 'last_error', 'available_at'])
+
+
+def process(events):
+    """
+    Deliver ``events`` with one ``notify_many`` per kind. If a kind's batch
+    fails its events are retried one by one so a single bad event only
+    delays itself. Returns ``(delivered, failed)`` counts.
+    """
+    by_kind = defaultdict(list)
+    for event in events:
+        by_kind[event.kind].append(event)
+
+    delivered = failed = 0
+    for kind, group in by_kind.items():
+        try:
+            with transaction.atomic():
+                deliver(kind, [row for event in group for row in event.payload['rows']])
+                OutboxEvent.objects.filter(id__in=[event.pk for event in group]).delete()
+            delivered += len(group)
+            continue
+        except Exception:
+            logger.exception('Outbox batch of %s %r events failed, retrying one by one', len(group), kind)
+        for event in group:
+            try:
+                with transaction.atomic():
+                    deliver(kind, event.payload['rows'])
+                    event.delete()
+                delivered += 1
+            except Exception as exc:
+                failed += 1
+                _fail(event, exc)
+    return delivered, failed
+
+
+def drain_once(limit=None):
+    """
+    Claim and process one batch. Returns ``(delivered, failed)``.
+    """
+    events = claim(limit or batch_size())
+    if not events:
+        return 0, 0
+    return process(events)
@@ -4,7 +4,30 @@ from .models import Notification
 class NotificationSerializer(serializers.ModelSerializer):
     actor_username = serializers.CharField(source='actor.username', read_only=True)
     target_str = serializers.CharField(source='target.__str__', read_only=True)
+    summary = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
-        fields = ['id', 'actor_username', 'verb', 'target_str', 'timestamp', 'read']
+        fields = [
+            'id', 'actor_username', 'verb', 'target_str', 'timestamp', 'read',
+            'actor_count', 'latest_actors', 'summary',
+        ]
+
+    def get_summary(self, obj):
+        """
+        e.g. "alice liked your post", "alice and 41 others liked your post".
+        """
+        others = obj.actor_count - 1
+        if others <= 0:
+            return f'{obj.actor.username} {obj.verb}'
+        return f"{obj.actor.username} and {others} other{'s' if others > 1 else ''} {obj.verb}"
+
+
+class MarkReadSerializer(serializers.Serializer):
+    up_to_id = serializers.IntegerField(min_value=1, required=False)
+    up_to = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if 'up_to_id' not in data and 'up_to' not in data:
+            raise serializers.ValidationError("Provide up_to_id and/or up_to.")
+        return data
@@ -0,0 +1,126 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Notification, NotificationSequence
+from .stream import notifications_changed
+from .unread import notifications_created
+
+
+def aggregation_window():
+    return getattr(settings, 'NOTIFICATION_AGGREGATION_WINDOW', 86400)
+
+
+def latest_actors_size():
+    return getattr(settings, 'NOTIFICATION_LATEST_ACTORS', 5)
+
+
+def _merge_actor(notification, actor_id, now):
+    """
+    Fold another ``actor_id`` into an aggregate row. Actors already among the
+    latest ones (e.g. like, unlike, like again) are moved to the front
+    without being counted twice.
+    """
+    latest = list(notification.latest_actors or [notification.actor_id])
+    if actor_id in latest:
+        latest.remove(actor_id)
+    else:
+        notification.actor_count += 1
+    notification.latest_actors = [actor_id, *latest][:latest_actors_size()]
+    notification.actor_id = actor_id
+    notification.timestamp = now
+
+
+def reserve_sequences(counts):
+    """
+    Reserve ``counts[recipient_id]`` stream sequence numbers per recipient
+    and return the first one of each. Recipients sharing a count are bumped
+    with one ``UPDATE``.
+    """
+    NotificationSequence.objects.bulk_create(
+        [NotificationSequence(recipient_id=recipient_id) for recipient_id in counts], ignore_conflicts=True
+    )
+    by_count = defaultdict(list)
+    for recipient_id, count in counts.items():
+        by_count[count].append(recipient_id)
+    for count, recipient_ids in by_count.items():
+        NotificationSequence.objects.filter(recipient_id__in=recipient_ids).update(value=F('value') + count)
+    values = NotificationSequence.objects.filter(recipient_id__in=counts).values_list('recipient_id', 'value')
+    return {recipient_id: value - counts[recipient_id] + 1 for recipient_id, value in values}
+
+
+def notify_many(verb, target_model, rows):
+    """
+    Notify one recipient per ``(recipient_id, actor_id, target_id)`` row,
+    skipping actions on the actor's own objects.
+
+    Rows for a ``(recipient, verb, target)`` that already has an unread
+    notification inside ``NOTIFICATION_AGGREGATION_WINDOW`` are folded into
+    it; the rest are inserted. Either way the batch costs one select, one
+    update and one insert, plus bumping the recipients' stream sequences.
+    Returns the newly created notifications.
+    """
+    rows = [(recipient_id, actor_id, target_id) for recipient_id, actor_id, target_id in rows
+            if recipient_id != actor_id]
+    if not rows:
+        return []
+    content_type = ContentType.objects.get_for_model(target_model)
+    now = timezone.now()
+    window = aggregation_window()
+
+    with transaction.atomic():
+        aggregates = {}
+        if window:
+            existing = (
+                Notification.objects.select_for_update()
+                .filter(
+                    recipient_id__in={recipient_id for recipient_id, _, _ in rows},
+                    verb=verb,
+                    target_content_type=content_type,
+                    target_object_id__in={target_id for _, _, target_id in rows},
+                    read=False,
+                    timestamp__gte=now - timedelta(seconds=window),
+                )
+                .order_by('timestamp')
+            )
+            # Newest row wins should the window ever hold more than one.
+            aggregates = {(n.recipient_id, n.target_object_id): n for n in existing}
+
+        created, pending, updated = [], {}, {}
+        for recipient_id, actor_id, target_id in rows:
+            key = (recipient_id, target_id)
+            if window and key in aggregates:
+                _merge_actor(aggregates[key], actor_id, now)
+                updated[key] = aggregates[key]
+            elif window and key in pending:
+                _merge_actor(pending[key], actor_id, now)
+            else:
+                pending[key] = Notification(
+                    recipient_id=recipient_id,
+                    actor_id=actor_id,
+                    verb=verb,
+                    target_content_type=content_type,
+                    target_object_id=target_id,
+                    latest_actors=[actor_id],
+                )
+                created.append(pending[key])
+
+        changed = [*updated.values(), *created]
+        sequences = reserve_sequences(Counter(n.recipient_id for n in changed))
+        for notification in changed:
+            notification.sequence = sequences[notification.recipient_id]
+            sequences[notification.recipient_id] += 1
+
+        if updated:
+            Notification.objects.bulk_update(
+                updated.values(), ['actor', 'actor_count', 'latest_actors', 'timestamp', 'sequence']
+            )
+        created = Notification.objects.bulk_create(created)
+        notifications_created(created)
+        notifications_changed(recipient_id for recipient_id, _, _ in rows)
+        return created
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = 'notifications:stream'
+BATCH_SIZE = 100
+
+
+def relay_key(user_id):
+    return f'{KEY_PREFIX}:{user_id}'
+
+
+def heartbeat_interval():
+    return getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+
+
+def relay_enabled():
+    return getattr(settings, 'NOTIFICATION_STREAM_RELAY', False)
+
+
+def relay_poll_interval():
+    return getattr(settings, 'NOTIFICATION_STREAM_RELAY_INTERVAL', 2)
+
+
+class Hub:
+    """
+    In-process pub/sub of "user X has new notifications" wake-ups.
+
+    Subscribers are ``asyncio.Event`` objects bound to the event loop that
+    serves the stream; ``publish`` may be called from any thread.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, user_id):
+        event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add((loop, event))
+        return loop, event
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_ids):
+        with self._lock:
+            targets = [sub for user_id in user_ids for sub in self._subscribers.get(user_id, ())]
+        for loop, event in targets:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(event.set)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._subscribers),
+                'connections': sum(len(subs) for subs in self._subscribers.values()),
+            }
+
+
+hub = Hub()
+
+
+def notifications_changed(user_ids):
+    """
+    Wake the streams of ``user_ids`` once the current transaction commits.
+    With ``NOTIFICATION_STREAM_RELAY`` the change is also recorded in the
+    cache so streams served by other processes (e.g. when the outbox worker
+    wrote the rows) pick it up on their next relay poll.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+
+    def publish():
+        if relay_enabled():
+            for user_id in user_ids:
+                try:
+                    cache.incr(relay_key(user_id))
+                except ValueError:
+                    cache.add(relay_key(user_id), 1, None)
+        hub.publish(user_ids)
+
+    transaction.on_commit(publish)
+
+
+def decode_event_id(value):
+    """
+    Stream sequence number from a ``Last-Event-ID`` header, or ``None``.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def format_event(event_id, data, event='notification'):
+    lines = [f'id: {event_id}', f'event: {event}']
+    lines.extend(f'data: {line}' for line in data.splitlines() or [''])
+    return '\n'.join(lines) + '\n\n'
+
+
+async def event_stream(user_id, cursor, fetch):
+    """
+    Server-Sent Events for ``user_id``. ``fetch(cursor, limit)`` (async)
+    returns up to ``limit`` ``(event_id, data, cursor)`` triples for what
+    came after ``cursor``; it runs on connect and whenever the hub or relay
+    reports a change, until a batch comes back short. Idle connections get
+    a comment line every ``NOTIFICATION_STREAM_HEARTBEAT`` seconds.
+    """
+    subscription = hub.subscribe(user_id)
+    _, woken = subscription
+    relay_version = None
+    try:
+        yield f'retry: {heartbeat_interval() * 1000}\n\n'
+        while True:
+            woken.clear()
+            if relay_enabled():
+                relay_version = await cache.aget(relay_key(user_id))
+            while True:
+                events = await fetch(cursor, BATCH_SIZE)
+                for event_id, data, cursor in events:
+                    yield format_event(event_id, data)
+                if len(events) < BATCH_SIZE:
+                    break
+
+            waited = 0
+            while True:
+                timeout = relay_poll_interval() if relay_enabled() else heartbeat_interval()
+                try:
+                    await asyncio.wait_for(woken.wait(), timeout)
+                    break
+                except asyncio.TimeoutError:
+                    waited += timeout
+                if relay_enabled():
+                    version = await cache.aget(relay_key(user_id))
+                    if version != relay_version:
+                        break
+                if waited >= heartbeat_interval():
+                    waited = 0
+                    yield ': heartbeat\n\n'
+    finally:
+        hub.unsubscribe(user_id, subscription)
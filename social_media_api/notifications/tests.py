@@ -1,3 +1,246 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from posts.models import Post
+
+from . import outbox, stream, unread
+from .models import Notification, OutboxEvent
+from .serializers import NotificationSerializer
+from .services import notify_many
+from .views import current_sequence, fetch_stream_events
+
+
+class NotificationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.author = User.objects.create_user(username='author')
+        self.fans = [User.objects.create_user(username=f'fan{i}') for i in range(3)]
+        self.post = Post.objects.create(author=self.author, title='one', content='hi')
+
+
+class AggregationTests(NotificationTestCase):
+    def like(self, *fans):
+        return notify_many('liked your post', Post, [(self.author.pk, fan.pk, self.post.pk) for fan in fans])
+
+    def test_likes_on_a_target_fold_into_one_row(self):
+        self.like(self.fans[0])
+        self.like(self.fans[1], self.fans[2])
+        self.like(self.fans[0])
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(notification.latest_actors, [self.fans[0].pk, self.fans[2].pk, self.fans[1].pk])
+        self.assertEqual(NotificationSerializer(notification).data['summary'], 'fan0 and 2 others liked your post')
+
+    def test_read_notifications_are_not_reopened(self):
+        self.like(self.fans[0])
+        Notification.objects.update(read=True)
+        self.like(self.fans[1])
+        self.assertEqual(Notification.objects.count(), 2)
+
+    @override_settings(NOTIFICATION_AGGREGATION_WINDOW=0)
+    def test_aggregation_can_be_disabled(self):
+        self.like(self.fans[0], self.fans[1])
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_own_actions_are_skipped(self):
+        self.assertEqual(self.like(self.author), [])
+        self.assertFalse(Notification.objects.exists())
+
+
+class ListTests(NotificationTestCase):
+    def notify(self, fans):
+        User = get_user_model()
+        posts = [Post.objects.create(author=self.author, title=f'p{fan.pk}', content='hi') for fan in fans]
+        notify_many('liked your post', Post, [(self.author.pk, fan.pk, post.pk) for fan, post in zip(fans, posts)])
+        notify_many('started following you', User, [(self.author.pk, fan.pk, self.author.pk) for fan in fans])
+
+    def list(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        return client.get('/api/notifications/').json()['results']
+
+    def test_mixed_targets_are_listed_in_constant_queries(self):
+        self.notify(self.fans[:1])
+        # Warm the content type cache, which is shared by the process.
+        self.list()
+        # Notifications with their actors, then one query per target model.
+        with self.assertNumQueries(3):
+            results = self.list()
+        self.assertEqual({result['verb'] for result in results}, {'liked your post', 'started following you'})
+
+        User = get_user_model()
+        self.notify([User.objects.create_user(username=f'more{i}') for i in range(4)])
+        with self.assertNumQueries(3):
+            results = self.list()
+        # The follows fold into one row; each like targets its own post.
+        self.assertEqual(len(results), 6)
+        self.assertEqual(
+            sorted(result['target_str'] for result in results),
+            ['author'] + sorted(post.title for post in Post.objects.exclude(pk=self.post.pk)),
+        )
+
+
+class UnreadTests(NotificationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def like(self, fan, title):
+        post = Post.objects.create(author=self.author, title=title, content='hi')
+        with self.captureOnCommitCallbacks(execute=True):
+            return notify_many('liked your post', Post, [(self.author.pk, fan.pk, post.pk)])
+
+    def unread_count(self):
+        return self.client.get('/api/notifications/unread-count/').json()['unread_count']
+
+    def test_counter_follows_new_and_read_notifications(self):
+        self.like(self.fans[0], 'a')
+        self.assertEqual(self.unread_count(), 1)
+        [second] = self.like(self.fans[1], 'b')
+        self.like(self.fans[2], 'c')
+        self.assertEqual(cache.get(unread.unread_key(self.author.pk)), 3)
+        self.assertEqual(self.unread_count(), 3)
+
+        # TestCase defers the on-commit adjustment past the response, so the
+        # counter is checked with a fresh request.
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/notifications/mark-read/', {'up_to_id': second.pk}, format='json')
+        self.assertEqual(response.json()['marked'], 2)
+        self.assertEqual(self.unread_count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/notifications/mark-read/', {'up_to': timezone.now()}, format='json')
+        self.assertEqual(response.json()['marked'], 1)
+        self.assertEqual(self.unread_count(), 0)
+
+    def test_mark_read_needs_a_bound(self):
+        response = self.client.post('/api/notifications/mark-read/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_drifted_counter_is_recounted(self):
+        self.like(self.fans[0], 'a')
+        cache.set(unread.unread_key(self.author.pk), -1)
+        self.assertEqual(self.unread_count(), 1)
+        unread.reset_unread([self.author.pk])
+        Notification.objects.update(read=True)
+        self.assertEqual(self.unread_count(), 0)
+
+
+@override_settings(NOTIFICATION_AGGREGATION_WINDOW=0)
+class PruneTests(NotificationTestCase):
+    def setUp(self):
+        super().setUp()
+        # Five notifications for the author, the oldest two past retention.
+        for age in range(5):
+            [notification] = notify_many('liked your post', Post, [(self.author.pk, self.fans[0].pk, self.post.pk)])
+            Notification.objects.filter(pk=notification.pk).update(timestamp=timezone.now() - timedelta(days=age * 50))
+        notify_many('liked your post', Post, [(self.fans[1].pk, self.fans[0].pk, self.post.pk)])
+
+    def prune(self, *args):
+        out = StringIO()
+        call_command('prune_notifications', '--batch-size=1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_prunes_by_age_and_cap_and_archives(self):
+        cache.set(unread.unread_key(self.author.pk), 5)
+        with tempfile.TemporaryDirectory() as archive_dir:
+            output = self.prune('--max-age-days=120', '--max-per-recipient=2', f'--archive-dir={archive_dir}')
+            [name] = os.listdir(archive_dir)
+            with gzip.open(os.path.join(archive_dir, name), 'rt', encoding='utf-8') as archive:
+                archived = [json.loads(line) for line in archive]
+        self.assertIn('Deleted 3 notifications', output)
+        self.assertEqual(len(archived), 3)
+        remaining = Notification.objects.filter(recipient=self.author).order_by('timestamp')
+        self.assertEqual(len(remaining), 2)
+        self.assertGreater(remaining[0].timestamp, timezone.now() - timedelta(days=51))
+        self.assertEqual(Notification.objects.filter(recipient=self.fans[1]).count(), 1)
+        self.assertIsNone(cache.get(unread.unread_key(self.author.pk)))
+
+    def test_dry_run_deletes_nothing(self):
+        output = self.prune('--max-age-days=120', '--max-per-recipient=2', '--dry-run')
+        self.assertIn('Would delete 3 notifications', output)
+        self.assertEqual(Notification.objects.count(), 6)
+
+
+@override_settings(NOTIFICATION_OUTBOX=True, OUTBOX_MAX_ATTEMPTS=2)
+class OutboxTests(NotificationTestCase):
+    def enqueue(self):
+        return outbox.notify('like', [(self.author.pk, self.fans[0].pk, self.post.pk)])
+
+    def test_claimed_events_are_not_claimed_again(self):
+        event = self.enqueue()
+        self.assertEqual(outbox.claim(10), [event])
+        self.assertEqual(outbox.claim(10), [])
+        self.assertGreater(OutboxEvent.objects.get().available_at, timezone.now())
+
+    def test_failures_back_off_then_give_up(self):
+        self.enqueue()
+        with mock.patch.object(outbox, 'deliver', side_effect=RuntimeError('down')):
+            self.assertEqual(outbox.drain_once(), (0, 1))
+            event = OutboxEvent.objects.get()
+            self.assertEqual((event.attempts, event.last_error), (1, 'RuntimeError: down'))
+            self.assertIsNotNone(event.available_at)
+
+            OutboxEvent.objects.update(available_at=timezone.now())
+            self.assertEqual(outbox.drain_once(), (0, 1))
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.attempts, 2)
+        self.assertIsNone(event.available_at)
+        self.assertEqual(outbox.claim(10), [])
+
+    def test_delivered_events_are_removed(self):
+        self.enqueue()
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(outbox.drain_once(), (1, 0))
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(Notification.objects.get().actor, self.fans[0])
+
+
+class StreamTests(NotificationTestCase):
+    def like(self, fan, post=None):
+        notify_many('liked your post', Post, [(self.author.pk, fan.pk, (post or self.post).pk)])
+
+    def test_reaggregated_rows_are_streamed_again(self):
+        self.like(self.fans[0])
+        cursor = current_sequence(self.author.pk)
+        self.assertEqual(fetch_stream_events(self.author.pk, cursor, 10), [])
+
+        self.like(self.fans[1])
+        [(event_id, data, cursor)] = fetch_stream_events(self.author.pk, cursor, 10)
+        self.assertEqual(json.loads(data)['actor_count'], 2)
+        self.assertEqual(stream.decode_event_id(event_id), cursor)
+        self.assertEqual(cursor, current_sequence(self.author.pk))
+
+    @mock.patch.object(stream, 'BATCH_SIZE', 2)
+    def test_stream_drains_every_batch(self):
+        posts = [Post.objects.create(author=self.author, title=f'p{i}', content='hi') for i in range(5)]
+        for post in posts:
+            self.like(self.fans[0], post)
+
+        async def read(count):
+            events = stream.event_stream(
+                self.author.pk, 0, sync_to_async(lambda c, limit: fetch_stream_events(self.author.pk, c, limit))
+            )
+            try:
+                return [await anext(events) for _ in range(count)][1:]
+            finally:
+                await events.aclose()
+
+        with override_settings(NOTIFICATION_STREAM_RELAY=False):
+            events = async_to_sync(read)(6)
+        self.assertEqual([event.split('\n')[0] for event in events], [f'id: {i}' for i in range(1, 6)])
@@ -0,0 +1,82 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Notification
+
+KEY_PREFIX = 'notifications:unread'
+
+
+def unread_key(user_id):
+    return f'{KEY_PREFIX}:{user_id}'
+
+
+def get_ttl():
+    # Bounds how long a drifted counter (missed increment, rows removed
+    # behind our back) can be served before it is recounted.
+    return getattr(settings, 'NOTIFICATION_UNREAD_TTL', 300)
+
+
+def count_unread(user_id):
+    return Notification.objects.filter(recipient_id=user_id, read=False).count()
+
+
+def get_unread_count(user_id):
+    """
+    Cached unread count, falling back to a count over the partial unread
+    index when the counter is missing or has drifted below zero.
+    """
+    value = cache.get(unread_key(user_id))
+    if value is None or value < 0:
+        value = count_unread(user_id)
+        cache.set(unread_key(user_id), value, get_ttl())
+    return value
+
+
+def reset_unread(user_ids):
+    """
+    Forget the counters of ``user_ids`` so they are recounted on next read.
+    """
+    cache.delete_many([unread_key(user_id) for user_id in user_ids])
+
+
+def adjust_unread(deltas):
+    """
+    Apply ``{user_id: delta}`` to the cached counters once the current
+    transaction commits. Missing counters are left to be recounted.
+    """
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    def apply():
+        for user_id, delta in deltas.items():
+            try:
+                cache.incr(unread_key(user_id), delta)
+            except ValueError:
+                pass
+
+    transaction.on_commit(apply)
+
+
+def notifications_created(notifications):
+    adjust_unread(Counter(notification.recipient_id for notification in notifications))
+
+
+def mark_read(user, up_to_id=None, up_to=None):
+    """
+    Mark ``user``'s unread notifications up to and including ``up_to_id``
+    and/or ``up_to`` (a timestamp) as read with a single ``UPDATE``.
+    Returns the number of notifications marked.
+    """
+    queryset = Notification.objects.filter(recipient=user, read=False)
+    if up_to_id is not None:
+        queryset = queryset.filter(id__lte=up_to_id)
+    if up_to is not None:
+        queryset = queryset.filter(timestamp__lte=up_to)
+    with transaction.atomic():
+        marked = queryset.update(read=True)
+        adjust_unread({user.pk: -marked})
+    return marked
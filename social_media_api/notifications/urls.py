@@ -1,6 +1,9 @@
 from django.urls import path
-from .views import NotificationListView
+from .views import MarkReadView, NotificationListView, UnreadCountView, notification_stream
 
 urlpatterns = [
     path('', NotificationListView.as_view(), name='notification-list'),
+    path('unread-count/', UnreadCountView.as_view(), name='notification-unread-count'),
+    path('mark-read/', MarkReadView.as_view(), name='notification-mark-read'),
+    path('stream/', notification_stream, name='notification-stream'),
 ]
@@ -1,12 +1,122 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
-from rest_framework import generics, permissions
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from .models import Notification
-from .serializers import NotificationSerializer
+from rest_framework.views import APIView
+from accounts.authentication import CachedTokenAuthentication
+from posts.models import Comment, Like, Post
+from posts.pagination import KeysetPagination
+from .models import Notification, NotificationSequence
+from .serializers import MarkReadSerializer, NotificationSerializer
+from .stream import decode_event_id, event_stream
+from .unread import get_unread_count, mark_read
+
+
+def target_querysets():
+    """
+    Querysets used to resolve notification targets, one per target model,
+    pulling in whatever each model's ``__str__`` reads.
+    """
+    return [
+        Post.objects.all(),
+        Like.objects.select_related('user', 'post'),
+        Comment.objects.select_related('author', 'post'),
+    ]
+
+
+def notification_queryset(user_id):
+    # Targets are fetched with one query per target model for the whole
+    # page instead of one query per notification.
+    return (
+        Notification.objects.filter(recipient_id=user_id)
+        .select_related('actor')
+        .prefetch_related(GenericPrefetch('target', target_querysets()))
+    )
+
 
 class NotificationListView(generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user).order_by('-timestamp')
+        return notification_queryset(self.request.user.pk).order_by('-timestamp', '-id')
+
+
+class UnreadCountView(APIView):
+    """
+    Unread badge count for the current user, served from a cached counter.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response({'unread_count': get_unread_count(request.user.pk)})
+
+
+class MarkReadView(APIView):
+    """
+    Mark every unread notification up to ``up_to_id`` and/or ``up_to`` as read.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = MarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        marked = mark_read(request.user, **serializer.validated_data)
+        return Response(
+            {'marked': marked, 'unread_count': get_unread_count(request.user.pk)},
+            status=status.HTTP_200_OK,
+        )
+
+
+def fetch_stream_events(user_id, cursor, limit):
+    """
+    Up to ``limit`` notifications created or re-aggregated after stream
+    sequence ``cursor``, oldest first, as ``(event_id, json, cursor)``
+    triples.
+    """
+    rows = list(
+        notification_queryset(user_id)
+        .filter(sequence__gt=cursor)
+        .order_by('sequence')[:limit]
+    )
+    data = NotificationSerializer(rows, many=True).data
+    return [(str(row.sequence), json.dumps(item), row.sequence) for row, item in zip(rows, data)]
+
+
+def current_sequence(user_id):
+    return (
+        NotificationSequence.objects.filter(recipient_id=user_id).values_list('value', flat=True).first() or 0
+    )
+
+
+async def notification_stream(request):
+    """
+    Server-Sent Events stream of the current user's notifications.
+
+    Authenticates with ``Authorization: Token <key>`` or, since browsers'
+    ``EventSource`` cannot set headers, ``?token=<key>``. Reconnecting
+    clients resume after their ``Last-Event-ID``.
+    """
+    header = request.headers.get('Authorization', '')
+    key = header[6:].strip() if header.startswith('Token ') else request.GET.get('token')
+    try:
+        user, _ = await sync_to_async(CachedTokenAuthentication().authenticate_credentials)(key or '')
+    except AuthenticationFailed:
+        return HttpResponse(status=401)
+
+    cursor = decode_event_id(request.headers.get('Last-Event-ID'))
+    if cursor is None:
+        cursor = await sync_to_async(current_sequence)(user.pk)
+    response = StreamingHttpResponse(
+        event_stream(user.pk, cursor, sync_to_async(lambda c, limit: fetch_stream_events(user.pk, c, limit))),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,182 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.response import Response
+
+KEY_PREFIX = 'respcache'
+# Version stamps expire instead of living forever, so stamps for scopes
+# nobody writes to (e.g. ids that do not exist) cannot pile up and crowd out
+# live ones. An expired stamp comes back as a fresh version, which only costs
+# a cache miss.
+VERSION_TTL = 3600
+# Hit/miss counts are kept per process and added to the shared counters
+# once this many have piled up.
+STATS_FLUSH_EVERY = 100
+DEFAULT_TTLS = {
+    'posts:list': 30,
+    'posts:detail': 60,
+    'feed': 15,
+}
+# Scope of every payload that embeds author usernames; bumped when a
+# username changes, which is rare enough to invalidate them all.
+AUTHORS_SCOPE = 'authors'
+
+
+def is_shared():
+    """
+    Whether the default cache is shared by every process. A process-local
+    cache only sees the bumps of writes this process handled, so response
+    caching and version-based conditional GETs are disabled without one.
+    """
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def is_enabled():
+    """
+    Whether responses are cached and conditional GETs use version stamps:
+    ``RESPONSE_CACHE`` is on and the default cache is shared and cheap. The
+    database cache is shared, but every stamp lookup on it is a write
+    transaction, which costs more than the queries it would save.
+    """
+    return (
+        getattr(settings, 'RESPONSE_CACHE', True)
+        and is_shared()
+        and not isinstance(caches['default'], DatabaseCache)
+    )
+
+
+def version_key(scope):
+    return f'{KEY_PREFIX}:version:{scope}'
+
+
+def modified_key(scope):
+    return f'{KEY_PREFIX}:modified:{scope}'
+
+
+def stats_key(resource, outcome):
+    return f'{KEY_PREFIX}:stats:{resource}:{outcome}'
+
+
+def _fresh_version():
+    # Seeding from the clock means a version evicted from the cache never
+    # comes back with a value that older payloads were stored under.
+    return int(time.time() * 1000)
+
+
+_stats_lock = threading.Lock()
+_pending_stats = Counter()
+
+
+def _count(resource, outcome):
+    with _stats_lock:
+        _pending_stats[(resource, outcome)] += 1
+        if sum(_pending_stats.values()) < STATS_FLUSH_EVERY:
+            return
+        pending = dict(_pending_stats)
+        _pending_stats.clear()
+    for (resource, outcome), count in pending.items():
+        key = stats_key(resource, outcome)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            if not cache.add(key, count, None):
+                cache.incr(key, count)
+
+
+def get_versions(scopes):
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _fresh_version(), VERSION_TTL)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def get_last_modified(scopes):
+    """
+    Unix time of the most recent bump of any of ``scopes``. Scopes without
+    a recorded time count as modified now, which is always safe.
+    """
+    keys = [modified_key(scope) for scope in scopes]
+    stamps = cache.get_many(keys)
+    for key in keys:
+        if key not in stamps:
+            cache.add(key, time.time(), VERSION_TTL)
+            stamps[key] = cache.get(key)
+    return max(stamps.values())
+
+
+def bump(*scopes):
+    """
+    Invalidate every cached response that depends on ``scopes`` in O(1):
+    bumping a version changes the keys new lookups are made under.
+    """
+    now = time.time()
+    for scope in scopes:
+        try:
+            cache.incr(version_key(scope))
+        except ValueError:
+            cache.add(version_key(scope), _fresh_version(), VERSION_TTL)
+    cache.set_many({modified_key(scope): now for scope in scopes}, VERSION_TTL)
+
+
+def get_ttl(resource):
+    ttls = {**DEFAULT_TTLS, **getattr(settings, 'RESPONSE_CACHE_TTLS', {})}
+    return ttls.get(resource, 30)
+
+
+def cached_response(request, resource, scopes, build, user=None):
+    """
+    Return the cached payload for this request, or call ``build()`` and
+    cache its response when it is a 200. ``user`` scopes the entry to a
+    single user (e.g. the home feed).
+    """
+    if not is_enabled():
+        response = build()
+        response['X-Cache'] = 'BYPASS'
+        return response
+    versions = '.'.join(str(version) for version in get_versions(scopes))
+    path = hashlib.sha1(request.get_full_path().encode('utf-8')).hexdigest()
+    owner = user.pk if user is not None else '-'
+    key = f'{KEY_PREFIX}:{resource}:{owner}:{versions}:{path}'
+
+    entry = cache.get(key)
+    if entry is not None:
+        _count(resource, 'hit')
+        response = Response(entry['data'], status=entry['status'], headers=entry['headers'])
+        response['X-Cache'] = 'HIT'
+        return response
+
+    _count(resource, 'miss')
+    response = build()
+    if response.status_code == 200:
+        entry = {'data': response.data, 'status': response.status_code, 'headers': dict(response.items())}
+        cache.set(key, entry, get_ttl(resource))
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+def get_stats():
+    """
+    Hit/miss counters per cached resource, including the counts this
+    process has not added to the shared counters yet.
+    """
+    keys = [stats_key(resource, outcome) for resource in DEFAULT_TTLS for outcome in ('hit', 'miss')]
+    values = cache.get_many(keys)
+    with _stats_lock:
+        pending = dict(_pending_stats)
+    return {
+        resource: {
+            outcome: values.get(stats_key(resource, outcome), 0) + pending.get((resource, outcome), 0)
+            for outcome in ('hit', 'miss')
+        }
+        for resource in DEFAULT_TTLS
+    }
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from .cache import is_enabled
+
+
+@register()
+def check_response_cache(app_configs, **kwargs):
+    if not getattr(settings, 'RESPONSE_CACHE', True) or is_enabled():
+        return []
+    return [Warning(
+        'RESPONSE_CACHE is on but the default cache is process-local or the database cache.',
+        hint='Configure Redis or Memcached as the default cache; response caching and conditional GETs '
+             'on posts fall back to uncached responses and payload ETags until then.',
+        id='posts.W001',
+    )]
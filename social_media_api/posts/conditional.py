@@ -0,0 +1,77 @@
+import hashlib
+import json
+
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import cache
+
+
+def is_not_modified(request, etag, last_modified=None):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        # Weak comparison, as required for GET/HEAD.
+        client_etags = [tag.removeprefix('W/') for tag in parse_etags(if_none_match)]
+        return etag in client_etags
+
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return (
+        last_modified is not None
+        and if_modified_since is not None
+        and int(last_modified) <= if_modified_since
+    )
+
+
+def matches_any(request):
+    # "If-None-Match: *" matches only when a current representation exists.
+    return '*' in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+
+
+def conditional_response(request, build, etag_source, last_modified=None):
+    """
+    Answer ``304 Not Modified`` without calling ``build()`` (and therefore
+    without running the query or the serializer) when the client's
+    validators still match. ``etag_source`` must change whenever the payload
+    would; ``last_modified`` is a Unix timestamp.
+    """
+    fingerprint = '|'.join([etag_source, request.get_full_path(), request.META.get('HTTP_ACCEPT', '')])
+    etag = quote_etag(hashlib.sha1(fingerprint.encode('utf-8')).hexdigest())
+
+    if is_not_modified(request, etag, last_modified):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = build()
+        if response.status_code == status.HTTP_200_OK and matches_any(request):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+
+    if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def versioned_conditional_response(request, scopes, build):
+    """
+    Conditional GET keyed on the response cache version stamps of ``scopes``,
+    which costs no database queries at all. Without a usable response cache
+    (see ``cache.is_enabled``) it falls back to a payload ETag.
+    """
+    if not cache.is_enabled():
+        return content_conditional_response(request, build)
+    versions = '.'.join(str(version) for version in cache.get_versions(scopes))
+    return conditional_response(request, build, versions, cache.get_last_modified(scopes))
+
+
+def content_conditional_response(request, build):
+    """
+    Conditional GET with an ETag taken from the payload itself, for
+    responses that no version stamp tracks exactly (e.g. lists embedding
+    counters). Saves the transfer, not the work of ``build()``.
+    """
+    response = build()
+    if response.status_code != status.HTTP_200_OK:
+        return response
+    payload = json.dumps(response.data, sort_keys=True, default=str)
+    return conditional_response(request, lambda: response, payload)
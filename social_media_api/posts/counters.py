@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, field):
+    """
+    ``COUNT(*)`` of ``queryset`` rows whose ``field`` points at the outer row.
+    """
+    counts = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def post_counters(Post, Like, Comment):
+    return {
+        'like_count': count_subquery(Like.objects.all(), 'post'),
+        'comment_count': count_subquery(Comment.objects.all(), 'post'),
+    }
+
+
+def user_counters(User):
+    Follow = User.followers.through
+    return {
+        'follower_count': count_subquery(Follow.objects.all(), 'from_coustomuser'),
+        'following_count': count_subquery(Follow.objects.all(), 'to_coustomuser'),
+    }
+
+
+def reconcile(queryset, counters):
+    """
+    Rewrite the counter columns of ``queryset`` rows that drifted from the
+    real counts in a single ``UPDATE``; returns the number of rows fixed.
+    """
+    fixed = 0
+    for field, expression in counters.items():
+        alias = f'actual_{field}'
+        fixed += (
+            queryset.alias(**{alias: expression})
+            .exclude(**{field: F(alias)})
+            .update(**{field: expression})
+        )
+    return fixed
+
+
+def reconcile_all(batch_size=1000):
+    from .models import Comment, Like, Post
+
+    totals = {}
+    for label, model, counters in (
+        ('posts', Post, post_counters(Post, Like, Comment)),
+        ('users', get_user_model(), user_counters(get_user_model())),
+    ):
+        fixed, last_id = 0, 0
+        while True:
+            ids = list(model.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            fixed += reconcile(model.objects.filter(pk__gte=ids[0], pk__lte=ids[-1]), counters)
+            last_id = ids[-1]
+        totals[label] = fixed
+    return totals
@@ -0,0 +1,208 @@
+import heapq
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from . import cache
+from .models import Post, TimelineEntry
+from .pagination import flip, seek_filter
+
+logger = logging.getLogger(__name__)
+
+FEED_ORDERING = ('-created_at', '-id')
+
+
+def timeline_max_length():
+    return getattr(settings, 'TIMELINE_MAX_LENGTH', 800)
+
+
+def fanout_follower_threshold():
+    return getattr(settings, 'FEED_FANOUT_FOLLOWER_THRESHOLD', 10000)
+
+
+def is_pushed(author):
+    """
+    Authors below the follower threshold are fanned out on write; everyone
+    else is pulled into their followers' feeds at read time.
+    """
+    return author.follower_count < fanout_follower_threshold()
+
+
+def follower_id_batches(author_id, batch_size=None):
+    """
+    Yield the ids of ``author_id``'s followers in batches, walking the
+    follow table's ``(from, to)`` index.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'TIMELINE_FANOUT_BATCH_SIZE', 1000)
+    Follow = get_user_model().followers.through
+    last_id = 0
+    while True:
+        batch = list(
+            Follow.objects.filter(from_coustomuser_id=author_id, to_coustomuser_id__gt=last_id)
+            .order_by('to_coustomuser_id')
+            .values_list('to_coustomuser_id', flat=True)[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+def fan_out_post(post):
+    """
+    Write ``post`` into the timeline of every follower of its author, unless
+    the author has too many followers and is pulled at read time instead.
+    """
+    if not is_pushed(post.author):
+        return
+    # Trimming walks the whole timeline of each follower, so only posts whose
+    # id is a multiple of TIMELINE_TRIM_INTERVAL pay for it. That is a global
+    # sample: a follower may go a long time without being trimmed here, so
+    # run the trim_timelines command periodically to bound every timeline.
+    trim = post.pk % getattr(settings, 'TIMELINE_TRIM_INTERVAL', 50) == 0
+    for batch in follower_id_batches(post.author_id):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=user_id, post_id=post.pk, created_at=post.created_at) for user_id in batch],
+            ignore_conflicts=True,
+        )
+        if trim:
+            trim_timelines(batch)
+        cache.bump(*[f'feed:{user_id}' for user_id in batch])
+
+
+def fan_out_posts(rows):
+    """
+    Outbox task fanning out the posts in ``[post_id]`` rows; posts deleted
+    in the meantime are skipped.
+    """
+    posts = Post.objects.select_related('author').in_bulk([post_id for post_id, in rows])
+    for post in posts.values():
+        fan_out_post(post)
+
+
+def backfill_timeline(user, author):
+    """
+    Copy the latest posts of a newly followed ``author`` into ``user``'s timeline.
+    """
+    if not is_pushed(author):
+        return
+    posts = (
+        Post.objects.filter(author=author)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:timeline_max_length()]
+    )
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user.pk, post_id=post_id, created_at=created_at) for post_id, created_at in posts],
+        ignore_conflicts=True,
+    )
+    trim_timelines([user.pk])
+
+
+def remove_from_timeline(user, author):
+    """
+    Drop an unfollowed ``author``'s posts from ``user``'s timeline.
+    """
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def trim_timelines(user_ids):
+    """
+    Delete everything past the newest ``TIMELINE_MAX_LENGTH`` entries of
+    each timeline in ``user_ids``.
+    """
+    overflow = list(
+        TimelineEntry.objects.filter(user_id__in=user_ids)
+        .annotate(position=Window(
+            RowNumber(),
+            partition_by=[F('user_id')],
+            order_by=[F('created_at').desc(), F('post_id').desc()],
+        ))
+        .filter(position__gt=timeline_max_length())
+        .values_list('pk', flat=True)
+    )
+    if overflow:
+        TimelineEntry.objects.filter(pk__in=overflow).delete()
+
+
+def rebuild_timeline(user):
+    """
+    Rebuild ``user``'s timeline from scratch out of the posts of everyone
+    they follow.
+    """
+    TimelineEntry.objects.filter(user=user).delete()
+    pushed_authors = user.following.filter(follower_count__lt=fanout_follower_threshold())
+    posts = (
+        Post.objects.filter(author__in=pushed_authors)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:timeline_max_length()]
+    )
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user.pk, post_id=post_id, created_at=created_at) for post_id, created_at in posts]
+    )
+
+
+class FeedEngine:
+    """
+    Hybrid home feed: the pushed part comes from the user's materialized
+    timeline, and the posts of followed authors above the fan-out threshold
+    are pulled from their own ``(author, -created_at, -id)`` index. All
+    sources are k-way merged by ``(created_at, id)``.
+
+    ``source`` records which path served the request: ``push``, ``pull`` or
+    ``hybrid``.
+    """
+    def __init__(self, user):
+        self.user = user
+        self.source = None
+
+    def fetch(self, values, reverse, limit):
+        """
+        ``KeysetPagination.paginate_rows`` fetcher returning posts ordered by
+        ``FEED_ORDERING``.
+        """
+        started = time.monotonic()
+        pulled_authors = list(
+            self.user.following.filter(follower_count__gte=fanout_follower_threshold())
+            .values_list('id', flat=True)
+        )
+        pushed = self._keys(
+            TimelineEntry.objects.filter(user=self.user), ('-created_at', '-post_id'), values, reverse, limit,
+        )
+        sources = [pushed] + [
+            self._keys(Post.objects.filter(author_id=author_id), FEED_ORDERING, values, reverse, limit)
+            for author_id in pulled_authors
+        ]
+
+        post_ids, seen = [], set()
+        for created_at, post_id in heapq.merge(*sources, reverse=not reverse):
+            # Authors that crossed the threshold can still have pushed entries.
+            if post_id not in seen:
+                seen.add(post_id)
+                post_ids.append(post_id)
+            if len(post_ids) == limit:
+                break
+
+        if not pulled_authors:
+            self.source = 'push'
+        else:
+            self.source = 'hybrid' if pushed else 'pull'
+        logger.info(
+            'feed user=%s source=%s pulled_authors=%d elapsed_ms=%.1f',
+            self.user.pk, self.source, len(pulled_authors), (time.monotonic() - started) * 1000,
+        )
+
+        posts = Post.objects.with_comment_preview().in_bulk(post_ids)
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+    def _keys(self, queryset, ordering, values, reverse, limit):
+        if values is not None:
+            queryset = queryset.filter(seek_filter(ordering, values, reverse))
+        if reverse:
+            ordering = [flip(field) for field in ordering]
+        id_field = ordering[-1].lstrip('-')
+        return list(queryset.order_by(*ordering).values_list('created_at', id_field)[:limit])
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db.models import Case, IntegerField, Value, When
+from rest_framework import filters
+
+from .search import get_backend
+
+
+class PostSearchFilter(filters.SearchFilter):
+    """
+    Ranked full-text search behind the usual ``?search=`` parameter.
+
+    Matches come from the search index ordered by relevance; the queryset is
+    re-ordered by that rank so keyset pagination pages through it. Only the
+    best ``SEARCH_MAX_RESULTS`` matches are returned; ``view.search_truncated``
+    records whether more matched. Databases
+    without a full-text backend fall back to ``SearchFilter`` over
+    ``search_fields``.
+    """
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        backend = get_backend()
+        if not query or backend is None:
+            return super().filter_queryset(request, queryset, view)
+
+        limit = getattr(settings, 'SEARCH_MAX_RESULTS', 500)
+        post_ids = backend.search(query, limit + 1)
+        view.search_truncated = len(post_ids) > limit
+        post_ids = post_ids[:limit]
+        if not post_ids:
+            return queryset.none()
+
+        rank = Case(
+            *[When(pk=pk, then=Value(position)) for position, pk in enumerate(post_ids)],
+            output_field=IntegerField(),
+        )
+        return queryset.filter(pk__in=post_ids).annotate(search_rank=rank).order_by('search_rank', 'id')
@@ -0,0 +1,182 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+from notifications import outbox
+
+from . import cache, trending
+from .counters import count_subquery, reconcile
+from .models import Like, Post
+
+logger = logging.getLogger(__name__)
+
+
+class LikeBuffer:
+    """
+    Write-behind buffer for like/unlike events under burst traffic.
+
+    Events are deduplicated per ``(user_id, post_id)`` (last one wins) and
+    flushed with ``bulk_create(ignore_conflicts=True)`` plus one bulk delete
+    when ``max_size`` events are pending or every ``flush_interval``
+    seconds, always on the flush thread and one batch at a time, so batches
+    reach the database in the order they were taken. Pending events are
+    flushed at interpreter exit; a hard kill loses at most one interval of
+    events. Flushed likes and unlikes score trending and bump the post
+    cache scope just like the synchronous ``like_posts``/``unlike_posts``.
+    """
+    def __init__(self, max_size=500, flush_interval=1.0):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self.metrics = {
+            'max_depth': 0,
+            'flushes': 0,
+            'flushed_events': 0,
+            'failures': 0,
+            'last_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+
+    def add(self, user_id, post_id, liked):
+        self._ensure_timer()
+        with self._lock:
+            self._pending[(user_id, post_id)] = liked
+            depth = len(self._pending)
+            self.metrics['max_depth'] = max(self.metrics['max_depth'], depth)
+        if depth >= self.max_size:
+            # Flush on the flush thread rather than in the request.
+            self._wake.set()
+
+    def flush(self):
+        # The batch is taken under the flush lock: a batch taken later must
+        # not be written before an earlier one, or an unlike could land
+        # before the like it undoes.
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            started = time.monotonic()
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception('Like buffer flush of %d events failed; requeueing', len(batch))
+                with self._lock:
+                    for key, liked in batch.items():
+                        self._pending.setdefault(key, liked)
+                self.metrics['failures'] += 1
+                return 0
+
+            elapsed = (time.monotonic() - started) * 1000
+            self.metrics['flushes'] += 1
+            self.metrics['flushed_events'] += len(batch)
+            self.metrics['last_flush_ms'] = elapsed
+            self.metrics['total_flush_ms'] += elapsed
+        return len(batch)
+
+    def stats(self):
+        with self._lock:
+            depth = len(self._pending)
+        flushes = self.metrics['flushes']
+        return {
+            **self.metrics,
+            'depth': depth,
+            'avg_flush_ms': self.metrics['total_flush_ms'] / flushes if flushes else 0.0,
+        }
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        self.flush()
+
+    def _write(self, batch):
+        post_ids = {post_id for _, post_id in batch}
+        authors = dict(Post.objects.filter(id__in=post_ids).values_list('id', 'author_id'))
+        likes = [key for key, liked in batch.items() if liked and key[1] in authors]
+        unlikes = [key for key, liked in batch.items() if not liked and key[1] in authors]
+
+        with transaction.atomic():
+            new_likes = []
+            if likes:
+                existing = set(
+                    Like.objects.filter(
+                        user_id__in={user_id for user_id, _ in likes},
+                        post_id__in={post_id for _, post_id in likes},
+                    ).values_list('user_id', 'post_id')
+                )
+                created = Like.objects.bulk_create(
+                    [Like(user_id=user_id, post_id=post_id) for user_id, post_id in likes],
+                    ignore_conflicts=True,
+                )
+                # Score at the stored like time, which a later unlike retracts.
+                new_likes = [like for like in created if (like.user_id, like.post_id) not in existing]
+            removed = []
+            if unlikes:
+                condition = Q()
+                for user_id, post_id in unlikes:
+                    condition |= Q(user_id=user_id, post_id=post_id)
+                # Read the like times first so the retraction hits the
+                # trending buckets the likes were scored in.
+                removed = list(Like.objects.filter(condition).values_list('id', 'post_id', 'created_at'))
+                Like.objects.filter(id__in=[like_id for like_id, _, _ in removed]).delete()
+
+            touched_ids = {post_id for _, post_id in likes + unlikes}
+            touched = Post.objects.filter(id__in=touched_ids)
+            reconcile(touched, {'like_count': count_subquery(Like.objects.all(), 'post')})
+            outbox.enqueue_many([
+                ('like', outbox.notification_rows(
+                    [(authors[like.post_id], like.user_id, like.post_id) for like in new_likes]
+                )),
+                trending.post_events(
+                    [(like.post_id, 'like', like.created_at, 1) for like in new_likes]
+                    + [(post_id, 'like', liked_at, -1) for _, post_id, liked_at in removed]
+                ),
+            ])
+            transaction.on_commit(lambda: cache.bump(*[f'post:{post_id}' for post_id in touched_ids]))
+
+    def _ensure_timer(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='like-buffer-flush', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def write_behind_enabled():
+    return getattr(settings, 'LIKE_WRITE_BEHIND', False)
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = LikeBuffer(
+                    max_size=getattr(settings, 'LIKE_BUFFER_MAX_SIZE', 500),
+                    flush_interval=getattr(settings, 'LIKE_BUFFER_FLUSH_INTERVAL', 1.0),
+                )
+                atexit.register(_buffer.stop)
+    return _buffer
@@ -0,0 +1,97 @@
+import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from notifications import outbox
+
+from . import cache, trending
+from .models import Like, Post
+
+
+def _aware(value):
+    # SQLite hands raw RETURNING timestamps back as naive UTC datetimes.
+    return timezone.make_aware(value, datetime.timezone.utc) if timezone.is_naive(value) else value
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _update_like_counts(post_ids, delta):
+    """
+    Adjust ``like_count`` of ``post_ids`` and return ``(post_id, author_id)``
+    pairs from the same statement.
+    """
+    if not post_ids:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE {post} SET like_count = like_count + %s WHERE id IN ({ids}) RETURNING id, author_id'.format(
+                post=Post._meta.db_table, ids=_placeholders(post_ids),
+            ),
+            [delta, *post_ids],
+        )
+        return cursor.fetchall()
+
+
+def like_posts(user, post_ids):
+    """
+    Like every existing post in ``post_ids`` for ``user`` with a single
+    ``INSERT ... ON CONFLICT DO NOTHING``; returns the ids that were not
+    liked before.
+    """
+    post_ids = list(dict.fromkeys(post_ids))
+    if not post_ids:
+        return []
+    with transaction.atomic():
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {like} (post_id, user_id, created_at) '
+                'SELECT id, %s, %s FROM {post} WHERE id IN ({ids}) '
+                'ON CONFLICT (post_id, user_id) DO NOTHING RETURNING post_id'.format(
+                    like=Like._meta.db_table, post=Post._meta.db_table, ids=_placeholders(post_ids),
+                ),
+                [user.pk, now, *post_ids],
+            )
+            liked = [row[0] for row in cursor.fetchall()]
+
+        authors = _update_like_counts(liked, 1)
+        outbox.enqueue_many([
+            ('like', outbox.notification_rows([(author_id, user.pk, post_id) for post_id, author_id in authors])),
+            trending.post_events([(post_id, 'like', now, 1) for post_id in liked]),
+        ])
+        _invalidate(liked)
+    return liked
+
+
+def unlike_posts(user, post_ids):
+    """
+    Remove ``user``'s likes on ``post_ids`` with a single
+    ``DELETE ... RETURNING``; returns the ids that were actually liked.
+    """
+    post_ids = list(dict.fromkeys(post_ids))
+    if not post_ids:
+        return []
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM {like} WHERE user_id = %s AND post_id IN ({ids}) RETURNING post_id, created_at'.format(
+                    like=Like._meta.db_table, ids=_placeholders(post_ids),
+                ),
+                [user.pk, *post_ids],
+            )
+            rows = cursor.fetchall()
+            unliked = [post_id for post_id, _ in rows]
+
+        _update_like_counts(unliked, -1)
+        trending.record([(post_id, 'like', _aware(liked_at), -1) for post_id, liked_at in rows])
+        _invalidate(unliked)
+    return unliked
+
+
+def _invalidate(post_ids):
+    # Raw statements skip model signals, so bump the response cache here.
+    if post_ids:
+        transaction.on_commit(lambda: cache.bump(*[f'post:{post_id}' for post_id in post_ids]))
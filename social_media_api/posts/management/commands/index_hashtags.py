@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts import parsing
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hashtag index of existing posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        indexed, last_id = 0, 0
+        while True:
+            posts = list(Post.objects.filter(id__gt=last_id).order_by('id')[:options['batch_size']])
+            if not posts:
+                break
+            for post in posts:
+                parsing.index_hashtags(post)
+            indexed += len(posts)
+            last_id = posts[-1].pk
+        self.stdout.write(self.style.SUCCESS(f'Indexed hashtags of {indexed} posts.'))
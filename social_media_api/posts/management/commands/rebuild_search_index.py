@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts.models import Post
+from posts.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the post full-text search index in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        if backend is None:
+            raise CommandError('The configured database has no full-text search backend.')
+
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        backend.create()
+        backend.clear()
+
+        indexed, last_id = 0, 0
+        while True:
+            rows = list(
+                Post.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'title', 'content')[:batch_size]
+            )
+            if not rows:
+                break
+            with transaction.atomic():
+                backend.index(rows)
+            indexed += len(rows)
+            last_id = rows[-1][0]
+            self.stdout.write(f'Indexed {indexed} posts...')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} posts in {elapsed:.1f}s.'))
@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.feed import rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized home timelines of all users in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        rebuilt, last_id = 0, 0
+        while True:
+            users = list(User.objects.filter(pk__gt=last_id).order_by('pk')[:options['batch_size']])
+            if not users:
+                break
+            with transaction.atomic():
+                for user in users:
+                    rebuild_timeline(user)
+            rebuilt += len(users)
+            last_id = users[-1].pk
+            self.stdout.write(f'Rebuilt {rebuilt} timelines...')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} timelines.'))
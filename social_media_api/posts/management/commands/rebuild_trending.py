@@ -0,0 +1,71 @@
+import math
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts import trending
+from posts.models import Comment, Like, Post, PostTag, TagTrendingScore, TrendingScore
+
+
+class Command(BaseCommand):
+    help = 'Rebuild post and hashtag trending scores from post, like, comment and tag history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = time.time()
+        windows = trending.get_windows()
+        # Events older than ~20 time constants of the longest window add nothing.
+        since = timezone.now() - timedelta(seconds=20 * max(windows.values()))
+        landmarks = {window: trending.epoch_for(tau, now) for window, tau in windows.items()}
+        scores = {TrendingScore: defaultdict(float), TagTrendingScore: defaultdict(float)}
+
+        sources = (
+            ('post', Post, 'id', TrendingScore),
+            ('like', Like, 'post_id', TrendingScore),
+            ('comment', Comment, 'post_id', TrendingScore),
+            ('tag', PostTag, 'tag_id', TagTrendingScore),
+        )
+        for kind, model, key_field, score_model in sources:
+            weight = trending.get_weight(kind)
+            events, last_id = 0, 0
+            while True:
+                rows = list(
+                    model.objects.filter(created_at__gte=since, id__gt=last_id)
+                    .order_by('id')
+                    .values_list('id', key_field, 'created_at')[:batch_size]
+                )
+                if not rows:
+                    break
+                for _, object_id, created_at in rows:
+                    for window, tau in windows.items():
+                        _, landmark = landmarks[window]
+                        scores[score_model][window, object_id] += weight * math.exp((created_at.timestamp() - landmark) / tau)
+                events += len(rows)
+                last_id = rows[-1][0]
+            self.stdout.write(f'Folded {events} {kind} events.')
+
+        with transaction.atomic():
+            for score_model, key_field in ((TrendingScore, 'post_id'), (TagTrendingScore, 'tag_id')):
+                score_model.objects.all().delete()
+                by_window = defaultdict(list)
+                for (window, object_id), score in scores[score_model].items():
+                    if score >= trending.PRUNE_BELOW:
+                        by_window[window].append((score, object_id))
+                score_model.objects.bulk_create(
+                    [
+                        score_model(window=window, epoch=landmarks[window][0], score=score, **{key_field: object_id})
+                        for window, ranked in by_window.items()
+                        for score, object_id in sorted(ranked, reverse=True)[:trending.max_rows()]
+                    ],
+                    batch_size=batch_size,
+                )
+        trending.reset()
+        total = sum(len(model_scores) for model_scores in scores.values())
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} trending scores.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile_all
+
+
+class Command(BaseCommand):
+    help = 'Repair drift in the denormalized like/comment/follower counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        totals = reconcile_all(batch_size=options['batch_size'])
+        for label, fixed in totals.items():
+            self.stdout.write(f'Fixed {fixed} {label} counters.')
+        self.stdout.write(self.style.SUCCESS('Counters reconciled.'))
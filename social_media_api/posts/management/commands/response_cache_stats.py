@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.cache import get_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the post and feed response cache.'
+
+    def handle(self, *args, **options):
+        for resource, counts in get_stats().items():
+            total = counts['hit'] + counts['miss']
+            ratio = counts['hit'] / total if total else 0
+            self.stdout.write(f"{resource}: {counts['hit']} hits, {counts['miss']} misses ({ratio:.1%} hit rate)")
@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.feed import trim_timelines
+
+
+class Command(BaseCommand):
+    help = 'Trim every materialized home timeline to TIMELINE_MAX_LENGTH entries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        checked, last_id = 0, 0
+        while True:
+            user_ids = list(
+                User.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not user_ids:
+                break
+            trim_timelines(user_ids)
+            checked += len(user_ids)
+            last_id = user_ids[-1]
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} timelines.'))
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+from posts.search import get_backend
+
+
+def create_search_index(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is None:
+        return
+    backend.create()
+    Post = apps.get_model('posts', 'Post')
+    backend.index(Post.objects.order_by('id').values_list('id', 'title', 'content').iterator())
+
+
+def drop_search_index(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is not None:
+        backend.drop()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_comment_post_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
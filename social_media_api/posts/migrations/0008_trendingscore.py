@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_post_author_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(max_length=16)),
+                ('epoch', models.IntegerField()),
+                ('score', models.FloatField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trending_scores', to='posts.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['window', 'epoch', '-score'], name='trending_window_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('window', 'post'), name='trending_window_post_uniq')],
+            },
+        ),
+    ]
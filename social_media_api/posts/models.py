@@ -6,12 +6,40 @@ from django.conf import settings
 
 User = settings.AUTH_USER_MODEL
 
+def comment_preview_prefetch(lookup='comments', size=None):
+    """
+    Prefetch the latest ``size`` comments (with their authors) of every post
+    reached through ``lookup`` into ``post.latest_comments``.
+    """
+    if size is None:
+        size = getattr(settings, 'POST_COMMENT_PREVIEW_SIZE', 3)
+    preview = Comment.objects.select_related('author').order_by('-created_at', '-id')[:size]
+    return models.Prefetch(lookup, queryset=preview, to_attr='latest_comments')
+
+class PostQuerySet(models.QuerySet):
+    def with_comment_preview(self, size=None):
+        """
+        Load authors and the latest ``size`` comments for every post in a
+        fixed number of queries.
+        """
+        return self.select_related('author').prefetch_related(comment_preview_prefetch(size=size))
+
 class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     title = models.CharField(max_length=255)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -23,6 +51,12 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='comment_created_id_idx'),
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_post_created_idx'),
+        ]
+
     def __str__(self):
         return f'Comment by {self.author} on {self.post}'
 
@@ -37,4 +71,88 @@ class Like(models.Model):
         unique_together = ('post', 'user')
 
     def __str__(self):
-        return f"{self.user.username} liked {self.post.title}"
\ No newline at end of file
+        return f"{self.user.username} liked {self.post.title}"
+
+class TimelineEntry(models.Model):
+    """
+    A post materialized into a follower's home timeline when it is written.
+    ``created_at`` copies the post's timestamp so a feed page is a single
+    range scan over ``(user, -created_at, -post)``.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='timeline_user_post_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='timeline_user_created_idx'),
+        ]
+
+class TrendingScore(models.Model):
+    """
+    Exponentially decayed popularity of a post within one trending window.
+
+    Scores use forward decay: an event at time ``t`` adds
+    ``weight * exp((t - landmark) / tau)``, so existing rows never need to
+    be recomputed and ranking by ``score`` equals ranking by decayed score.
+    ``epoch`` identifies the landmark; it is advanced (and scores rescaled)
+    before the exponent can overflow.
+    """
+    window = models.CharField(max_length=16)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='trending_scores')
+    epoch = models.IntegerField()
+    score = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['window', 'post'], name='trending_window_post_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['window', 'epoch', '-score'], name='trending_window_score_idx'),
+        ]
+
+class Tag(models.Model):
+    name = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'#{self.name}'
+
+class PostTag(models.Model):
+    """
+    Hashtag index: one row per tag used in a post. ``created_at`` copies the
+    post's timestamp so a tag's posts page is a single range scan over
+    ``(tag, -created_at, -post)``.
+    """
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='post_tags')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='post_tags')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'post'], name='posttag_tag_post_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['tag', '-created_at', '-post'], name='posttag_tag_created_idx'),
+        ]
+
+class TagTrendingScore(models.Model):
+    """
+    Decayed usage of a hashtag within one trending window; see
+    ``TrendingScore`` for how scores are kept.
+    """
+    window = models.CharField(max_length=16)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='trending_scores')
+    epoch = models.IntegerField()
+    score = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['window', 'tag'], name='tagtrending_window_tag_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['window', 'epoch', '-score'], name='tagtrending_window_score_idx'),
+        ]
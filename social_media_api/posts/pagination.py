@@ -0,0 +1,212 @@
+import base64
+import json
+from collections import OrderedDict
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def parse_limit(request, default, maximum, param='limit'):
+    """
+    ``?limit=`` of a ranked (unpaginated) listing, clamped to
+    ``1..maximum``.
+    """
+    try:
+        limit = int(request.query_params.get(param, default))
+    except ValueError:
+        raise ValidationError({param: 'A valid integer is required.'})
+    return max(1, min(limit, maximum))
+
+
+def flip(field):
+    return field[1:] if field.startswith('-') else '-' + field
+
+
+def seek_filter(ordering, values, reverse=False):
+    """
+    Build ``(a < x) OR (a = x AND b < y) OR ...`` selecting the rows after
+    ``values`` in ``ordering`` (before them when ``reverse``).
+    """
+    seek = Q()
+    for index, field in enumerate(ordering):
+        descending = field.startswith('-')
+        if reverse:
+            descending = not descending
+        name = field.lstrip('-')
+        clause = Q(**{'%s__%s' % (name, 'lt' if descending else 'gt'): values[index]})
+        for prev_field, prev_value in zip(ordering[:index], values[:index]):
+            clause &= Q(**{prev_field.lstrip('-'): prev_value})
+        seek |= clause
+    return seek
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque-cursor pagination keyed on the queryset ordering, e.g.
+    ``('-created_at', '-id')``. Every page is a single range scan over the
+    matching composite index, so deep pages cost the same as the first one
+    and pages do not drift while new rows arrive.
+
+    The last ordering field must be unique so that ties are broken.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+    # Model the ordering fields belong to, and the queryset's annotations
+    # (e.g. a search rank); cursor values are checked against them.
+    model = None
+    annotations = {}
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = self.get_ordering(queryset)
+        self.model = queryset.model
+        self.annotations = queryset.query.annotations
+
+        def fetch(values, reverse, limit):
+            page = queryset
+            if values is not None:
+                page = page.filter(seek_filter(self.ordering, values, reverse))
+            ordering = [flip(field) for field in self.ordering] if reverse else self.ordering
+            return list(page.order_by(*ordering)[:limit])
+
+        return self.paginate_rows(fetch, request)
+
+    def paginate_rows(self, fetch, request, model=None):
+        """
+        Paginate any keyset-ordered source. ``fetch(values, reverse, limit)``
+        returns up to ``limit`` rows strictly after ``values`` in
+        ``self.ordering`` (or before them, newest last, when ``reverse``).
+        ``model`` is the model whose fields ``self.ordering`` names.
+        """
+        if model is not None:
+            self.model = model
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        reverse, values = cursor if cursor is not None else (False, None)
+
+        results = fetch(values, reverse, self.page_size + 1)
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                value = int(request.query_params[self.page_size_query_param])
+            except (KeyError, ValueError):
+                pass
+            else:
+                if value > 0:
+                    return min(value, self.max_page_size)
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        """
+        Use the queryset's own ordering when it has one, so filters that
+        re-rank results (e.g. search) keep paging consistently.
+        """
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)]
+        return tuple(ordering) or tuple(self.ordering)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, instance, reverse):
+        values = [self._encode_value(self._get_value(instance, field)) for field in self.ordering]
+        payload = json.dumps({'r': int(reverse), 'v': values}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        url = remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            reverse, values = bool(payload['r']), list(payload['v'])
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, [self._decode_value(field, value) for field, value in zip(self.ordering, values)]
+
+    def _get_value(self, instance, field):
+        value = instance
+        for attr in field.lstrip('-').split('__'):
+            value = getattr(value, attr)
+        return value
+
+    def _decode_value(self, field, value):
+        """
+        Convert a cursor value to the Python type of its ordering field, so
+        tampered cursors are rejected here instead of failing in the query.
+        """
+        if value is None or isinstance(value, (list, dict)):
+            raise NotFound(self.invalid_cursor_message)
+        if self.model is None:
+            return value
+        model, path = self.model, field.lstrip('-').split('__')
+        try:
+            if len(path) == 1 and path[0] in self.annotations:
+                value = self.annotations[path[0]].output_field.to_python(value)
+                path = []
+            for name in path[:-1]:
+                model = model._meta.get_field(name).related_model
+            if path:
+                model_field = model._meta.pk if path[-1] == 'pk' else model._meta.get_field(path[-1])
+                value = model_field.to_python(value)
+        except (FieldDoesNotExist, DjangoValidationError, TypeError, ValueError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return value
+
+    def _encode_value(self, value):
+        # isoformat keeps microseconds, which the seek filter needs to be exact.
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
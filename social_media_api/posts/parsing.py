@@ -0,0 +1,172 @@
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from notifications import outbox
+
+from . import trending
+from .models import Post, PostTag, Tag
+from .pagination import flip, seek_filter
+
+# "@name" not preceded by a word character, so e-mail addresses don't count.
+MENTION_RE = re.compile(r'(?<![\w@])@([\w.+-]*\w)')
+# "#tag" with at least one letter, so "#1" doesn't count.
+HASHTAG_RE = re.compile(r'(?<![\w#&])#(\w*[^\W\d_]\w*)')
+TAG_MAX_LENGTH = 64
+TAG_ORDERING = ('-created_at', '-post_id')
+
+
+def max_mentions():
+    return getattr(settings, 'MENTIONS_MAX_PER_TEXT', 20)
+
+
+def max_hashtags():
+    return getattr(settings, 'HASHTAGS_MAX_PER_POST', 20)
+
+
+def _unique(values, limit):
+    seen = {}
+    for value in values:
+        seen.setdefault(value, None)
+        if len(seen) == limit:
+            break
+    return list(seen)
+
+
+def extract_mentions(text):
+    """
+    Distinct usernames mentioned in ``text``, in order of appearance.
+    """
+    return _unique(MENTION_RE.findall(text or ''), max_mentions())
+
+
+def extract_hashtags(text):
+    """
+    Distinct lower-cased hashtags in ``text``, in order of appearance.
+    """
+    tags = (tag.lower() for tag in HASHTAG_RE.findall(text or '') if len(tag) <= TAG_MAX_LENGTH)
+    return _unique(tags, max_hashtags())
+
+
+def post_text(post):
+    return f'{post.title}\n{post.content}'
+
+
+def resolve_mentions(usernames):
+    """
+    Ids of the active users among ``usernames``, in one query.
+    """
+    if not usernames:
+        return []
+    return list(
+        get_user_model().objects.filter(username__in=usernames, is_active=True).values_list('id', flat=True)
+    )
+
+
+def mention_notifications(kind, text, actor_id, post_id, previous_text=None):
+    """
+    Outbox part notifying users mentioned in ``text`` with ``kind``
+    notifications. On edits, only users that ``previous_text`` did not
+    mention yet are notified.
+    """
+    usernames = extract_mentions(text)
+    if previous_text is not None:
+        already = set(extract_mentions(previous_text))
+        usernames = [username for username in usernames if username not in already]
+    return kind, outbox.notification_rows([(user_id, actor_id, post_id) for user_id in resolve_mentions(usernames)])
+
+
+def notify_mentions(kind, text, actor_id, post_id, previous_text=None):
+    """
+    Queue the notifications of ``mention_notifications``.
+    """
+    outbox.enqueue_many([mention_notifications(kind, text, actor_id, post_id, previous_text)])
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _add_post_tags(post, tag_ids):
+    """
+    Insert ``post``'s index rows for ``tag_ids``; returns the tag ids whose
+    rows this call actually inserted.
+    """
+    created_at = connection.ops.adapt_datetimefield_value(post.created_at)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO {table} (tag_id, post_id, created_at) VALUES {rows} '
+            'ON CONFLICT (tag_id, post_id) DO NOTHING RETURNING tag_id'.format(
+                table=PostTag._meta.db_table, rows=', '.join(['(%s, %s, %s)'] * len(tag_ids)),
+            ),
+            [value for tag_id in tag_ids for value in (tag_id, post.pk, created_at)],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _remove_post_tags(post, tag_ids):
+    """
+    Delete ``post``'s index rows for ``tag_ids``; returns the tag ids whose
+    rows this call actually deleted.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'DELETE FROM {table} WHERE post_id = %s AND tag_id IN ({ids}) RETURNING tag_id'.format(
+                table=PostTag._meta.db_table, ids=_placeholders(tag_ids),
+            ),
+            [post.pk, *tag_ids],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def index_hashtags(post, created=False):
+    """
+    Bring ``post``'s rows in the hashtag index in line with its text and
+    count added (or retract removed) tags towards trending tags. Only rows
+    this call inserted or deleted count, so concurrent saves of the same
+    post cannot count a tag twice.
+    """
+    names = extract_hashtags(post_text(post))
+    existing = {} if created else dict(
+        PostTag.objects.filter(post=post).values_list('tag__name', 'tag_id')
+    )
+    removed = [tag_id for name, tag_id in existing.items() if name not in names]
+    added = [name for name in names if name not in existing]
+    if removed:
+        removed = _remove_post_tags(post, removed)
+    if added:
+        Tag.objects.bulk_create([Tag(name=name) for name in added], ignore_conflicts=True)
+        added = _add_post_tags(post, list(Tag.objects.filter(name__in=added).values_list('id', flat=True)))
+    events = [(tag_id, 'tag', post.created_at, 1) for tag_id in added]
+    events += [(tag_id, 'tag', post.created_at, -1) for tag_id in removed]
+    if events:
+        trending.record_tags(events)
+
+
+def unindex_hashtags(post):
+    """
+    Retract ``post``'s tags from trending tags; its index rows go with the
+    post.
+    """
+    tag_ids = list(PostTag.objects.filter(post=post).values_list('tag_id', flat=True))
+    if tag_ids:
+        trending.record_tags([(tag_id, 'tag', post.created_at, -1) for tag_id in tag_ids])
+
+
+def tagged_posts(tag_id, values, reverse, limit):
+    """
+    ``KeysetPagination.paginate_rows`` fetcher returning posts tagged
+    ``tag_id`` ordered by ``(-created_at, -id)``, read off the
+    ``(tag, -created_at, -post)`` index.
+    """
+    queryset = PostTag.objects.filter(tag_id=tag_id)
+    ordering = TAG_ORDERING
+    if values is not None:
+        queryset = queryset.filter(seek_filter(ordering, values, reverse))
+    if reverse:
+        ordering = [flip(field) for field in ordering]
+    post_ids = list(queryset.order_by(*ordering).values_list('post_id', flat=True)[:limit])
+    posts = Post.objects.with_comment_preview().in_bulk(post_ids)
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
@@ -0,0 +1,175 @@
+import re
+from abc import ABC, abstractmethod
+
+from django.db import connection
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return WORD_RE.findall(query.lower())
+
+
+class SearchBackend(ABC):
+    """
+    Maintains a full-text index over ``Post.title``/``Post.content`` in a
+    side table and answers ranked prefix queries against it.
+
+    ``rows`` are ``(id, title, content)`` tuples so the same code can be used
+    from migrations with historical models.
+    """
+    def __init__(self, connection):
+        self.connection = connection
+
+    @abstractmethod
+    def create(self):
+        pass
+
+    @abstractmethod
+    def drop(self):
+        pass
+
+    @abstractmethod
+    def index(self, rows):
+        pass
+
+    @abstractmethod
+    def remove(self, post_ids):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    @abstractmethod
+    def search(self, query, limit):
+        """
+        Return matching post ids, best match first.
+        """
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    FTS5 virtual table ranked with bm25, title weighted above content.
+    """
+    table = 'posts_post_fts'
+
+    def create(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(title, content, tokenize='unicode61')" % self.table
+            )
+
+    def drop(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS %s' % self.table)
+
+    def index(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        self.remove([row[0] for row in rows])
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO %s (rowid, title, content) VALUES (%%s, %%s, %%s)' % self.table, rows
+            )
+
+    def remove(self, post_ids):
+        post_ids = list(post_ids)
+        if not post_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(post_ids))
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s WHERE rowid IN (%s)' % (self.table, placeholders), post_ids)
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s' % self.table)
+
+    def search(self, query, limit):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = ' '.join('"%s"*' % term for term in terms)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM {table} WHERE {table} MATCH %s '
+                'ORDER BY bm25({table}, 2.0, 1.0) LIMIT %s'.format(table=self.table),
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    ``tsvector`` side table with a GIN index, ranked with ``ts_rank``.
+    """
+    table = 'posts_post_search'
+    document = "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B')"
+
+    def create(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS %s ('
+                'post_id bigint PRIMARY KEY REFERENCES posts_post (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+                'document tsvector NOT NULL)' % self.table
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS %s_document_idx ON %s USING GIN (document)' % (self.table, self.table)
+            )
+
+    def drop(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS %s' % self.table)
+
+    def index(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO %s (post_id, document) VALUES (%%s, %s) '
+                'ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document' % (self.table, self.document),
+                rows,
+            )
+
+    def remove(self, post_ids):
+        post_ids = list(post_ids)
+        if not post_ids:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s WHERE post_id = ANY(%%s)' % self.table, [post_ids])
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('TRUNCATE %s' % self.table)
+
+    def search(self, query, limit):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        tsquery = ' & '.join('%s:*' % term for term in terms)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT post_id FROM {table}, to_tsquery('simple', %s) query "
+                'WHERE document @@ query ORDER BY ts_rank(document, query) DESC, post_id DESC '
+                'LIMIT %s'.format(table=self.table),
+                [tsquery, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(db_connection=None):
+    """
+    Search backend for the given connection, or ``None`` when the database
+    has no supported full-text engine.
+    """
+    db_connection = db_connection or connection
+    backend_class = BACKENDS.get(db_connection.vendor)
+    return backend_class(db_connection) if backend_class else None
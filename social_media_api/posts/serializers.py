@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Post, Comment
 
@@ -6,18 +7,56 @@ class CommentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Comment
-        fields = ['id', 'author', 'content', 'created_at', 'updated_at']
+        fields = ['id', 'post', 'author', 'content', 'created_at', 'updated_at']
+
+    def validate_post(self, value):
+        # Moving a comment would leave both posts' comment_count wrong.
+        if self.instance is not None and value.pk != self.instance.post_id:
+            raise serializers.ValidationError('Comments cannot be moved to another post.')
+        return value
 
 class PostSerializer(serializers.ModelSerializer):
+    """
+    Embeds only a preview of the latest comments; the full thread lives at
+    ``/posts/{id}/comments/``. Expects a queryset built with
+    ``Post.objects.with_comment_preview()``.
+    """
     author = serializers.StringRelatedField(read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
+    latest_comments = CommentSerializer(many=True, read_only=True)
 
     class Meta:
         model = Post
-        fields = ['id', 'author', 'title', 'content', 'created_at', 'updated_at', 'comments']
+        fields = [
+            'id', 'author', 'title', 'content', 'created_at', 'updated_at',
+            'like_count', 'comment_count', 'latest_comments',
+        ]
+        read_only_fields = ['like_count', 'comment_count']
+
+    def to_representation(self, instance):
+        if not hasattr(instance, 'latest_comments'):
+            # Instances coming from create/update were not loaded with the preview.
+            instance = Post.objects.with_comment_preview().get(pk=instance.pk)
+        return super().to_representation(instance)
 from .models import Like
 
 class LikeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Like
         fields = ['id', 'post', 'user', 'created_at']
+
+
+# Largest id a 64-bit primary key can hold; bigger ones overflow the driver.
+MAX_ID = 2 ** 63 - 1
+
+
+class LikeBatchSerializer(serializers.Serializer):
+    like = serializers.ListField(child=serializers.IntegerField(min_value=1, max_value=MAX_ID), required=False, default=list)
+    unlike = serializers.ListField(child=serializers.IntegerField(min_value=1, max_value=MAX_ID), required=False, default=list)
+
+    def validate(self, data):
+        max_size = getattr(settings, 'LIKE_BATCH_MAX_SIZE', 100)
+        if len(data['like']) + len(data['unlike']) > max_size:
+            raise serializers.ValidationError(f"At most {max_size} posts can be liked or unliked at once.")
+        if set(data['like']) & set(data['unlike']):
+            raise serializers.ValidationError("A post cannot be liked and unliked in the same batch.")
+        return data
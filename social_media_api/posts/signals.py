@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import cache, parsing
+from .models import Comment, Like, Post
+from .search import get_backend
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    backend = get_backend()
+    if backend is not None and not raw:
+        backend.index([(instance.pk, instance.title, instance.content)])
+
+
+@receiver(post_save, sender=Post)
+def index_post_hashtags(sender, instance, created=False, raw=False, **kwargs):
+    if not raw:
+        parsing.index_hashtags(instance, created=created)
+
+
+@receiver(pre_delete, sender=Post)
+def unindex_post_hashtags(sender, instance, **kwargs):
+    # Before the cascade removes the post's rows in the hashtag index.
+    parsing.unindex_hashtags(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    backend = get_backend()
+    if backend is not None:
+        backend.remove([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Like)
+def invalidate_post_responses(sender, instance, **kwargs):
+    # Only post writes change what the post list contains; likes and
+    # comments only touch their post, and list counters catch up within
+    # the list's cache TTL.
+    if sender is Post:
+        scopes = ['posts', f'post:{instance.pk}']
+    else:
+        scopes = [f'post:{instance.post_id}']
+    if sender is Comment:
+        scopes.append('comments')
+    # Bump after commit so counter updates in the same transaction are
+    # visible before anyone can re-cache the payload.
+    transaction.on_commit(lambda: cache.bump(*scopes))
+
+
+@receiver(m2m_changed, sender=get_user_model().followers.through)
+def invalidate_feed_responses(sender, instance, action, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    user_ids = {instance.pk, *(pk_set or ())}
+    transaction.on_commit(lambda: cache.bump(*[f'feed:{user_id}' for user_id in user_ids]))
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_author_responses(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    # Posts and comments show their author's username.
+    if created or raw or (update_fields is not None and 'username' not in update_fields):
+        return
+    transaction.on_commit(lambda: cache.bump(cache.AUTHORS_SCOPE))
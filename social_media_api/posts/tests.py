@@ -1,3 +1,566 @@
-from django.test import TestCase
+import base64
+import json
+import threading
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from notifications import outbox
+from notifications.models import Notification, OutboxEvent
+
+from .counters import reconcile_all
+from . import cache as response_cache, parsing, trending
+from .like_buffer import LikeBuffer
+from .models import Comment, Like, Post, PostTag, Tag, TimelineEntry, TrendingScore
+
+
+def enable_response_cache(test):
+    # The test settings use the database cache, on which response caching
+    # is off; the code paths are the same on Redis.
+    patcher = mock.patch.object(response_cache, 'is_enabled', return_value=True)
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
+def make_cursor(values, reverse=False):
+    payload = json.dumps({'r': int(reverse), 'v': values}).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create_user(username='author')
+        cls.posts = [Post.objects.create(author=cls.author, title=f'post {i}', content='') for i in range(7)]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def titles(self, data):
+        return [post['title'] for post in data['results']]
+
+    def test_cursor_round_trip(self):
+        first = self.client.get('/api/posts/?page_size=3').json()
+        self.assertEqual(self.titles(first), ['post 6', 'post 5', 'post 4'])
+        self.assertIsNone(first['previous'])
+
+        second = self.client.get(first['next']).json()
+        self.assertEqual(self.titles(second), ['post 3', 'post 2', 'post 1'])
+        third = self.client.get(second['next']).json()
+        self.assertEqual(self.titles(third), ['post 0'])
+        self.assertIsNone(third['next'])
+
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(self.titles(back), self.titles(first))
+
+    def test_malformed_cursors_are_not_found(self):
+        post = self.posts[0]
+        cursors = [
+            'zzz',
+            make_cursor([post.created_at.isoformat()]),
+            make_cursor(['nope', 'x']),
+            make_cursor([post.created_at.isoformat(), 'x']),
+            make_cursor([None, post.pk]),
+            make_cursor([[1], {'a': 1}]),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get('/api/posts/', {'cursor': cursor}).status_code, 404)
+
+    def test_malformed_feed_cursor_is_not_found(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.get('/api/feed/', {'cursor': make_cursor(['nope', 'x'])})
+        self.assertEqual(response.status_code, 404)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = get_user_model().objects.create_user(username='author')
+        for i in range(3):
+            Post.objects.create(author=author, title=f'django tips {i}', content='')
+        Post.objects.create(author=author, title='unrelated', content='')
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SEARCH_MAX_RESULTS=2)
+    def test_truncated_results_are_flagged(self):
+        data = APIClient().get('/api/posts/', {'search': 'django'}).json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertTrue(data['search_truncated'])
+
+    @override_settings(SEARCH_MAX_RESULTS=2)
+    def test_truncation_flag_holds_on_later_pages(self):
+        client = APIClient()
+        first = client.get('/api/posts/', {'search': 'django', 'page_size': 1}).json()
+        second = client.get(first['next']).json()
+        self.assertTrue(second['search_truncated'])
+        self.assertIsNone(second['next'])
+        self.assertEqual(len({first['results'][0]['id'], second['results'][0]['id']}), 2)
+
+    def test_pages_through_ranked_results(self):
+        client = APIClient()
+        data = client.get('/api/posts/', {'search': 'django', 'page_size': 2}).json()
+        titles = [post['title'] for post in data['results']]
+        data = client.get(data['next']).json()
+        titles += [post['title'] for post in data['results']]
+        self.assertIsNone(data['next'])
+        self.assertEqual(sorted(titles), [f'django tips {i}' for i in range(3)])
+
+    def test_complete_results_are_not_flagged(self):
+        data = APIClient().get('/api/posts/', {'search': 'django'}).json()
+        self.assertEqual(len(data['results']), 3)
+        self.assertFalse(data['search_truncated'])
+        self.assertNotIn('search_truncated', APIClient().get('/api/posts/').json())
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.author, title='one', content='')
+        self.other = Post.objects.create(author=self.author, title='two', content='')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def test_reconcile_repairs_drift(self):
+        Like.objects.create(post=self.post, user=self.reader)
+        Comment.objects.create(post=self.post, author=self.reader, content='hi')
+        self.reader.following.add(self.author)
+        Post.objects.filter(pk=self.other.pk).update(like_count=5)
+
+        totals = reconcile_all()
+        self.assertEqual(totals, {'posts': 3, 'users': 2})
+        self.post.refresh_from_db()
+        self.other.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 1))
+        self.assertEqual(self.other.like_count, 0)
+        self.assertEqual(self.author.follower_count, 1)
+        self.assertEqual(reconcile_all(), {'posts': 0, 'users': 0})
+
+    def test_comment_cannot_move_to_another_post(self):
+        comment = self.client.post('/api/comments/', {'post': self.post.pk, 'content': 'hi'}, format='json').json()
+        response = self.client.patch(f"/api/comments/{comment['id']}/", {'post': self.other.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f"/api/comments/{comment['id']}/", {'content': 'edited'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.post.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.post.comment_count, self.other.comment_count), (1, 0))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class QueryCountTests(TestCase):
+    # A process-local cache keeps response caching and cache reads off the
+    # database, so only the queries that load the payload are counted.
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        authors = [User.objects.create_user(username=f'author{i}') for i in range(3)]
+        for i in range(12):
+            post = Post.objects.create(author=authors[i % 3], title=f'post {i}', content='')
+            for j in range(4):
+                Comment.objects.create(post=post, author=authors[j % 3], content=f'comment {j}')
+        cls.post = post
+
+    def test_post_list_page(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/posts/')
+        self.assertEqual(len(response.json()['results']), 10)
+
+    def test_post_detail(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/posts/{self.post.pk}/')
+        self.assertEqual(response.status_code, 200)
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.author = User.objects.create_user(username='author')
+        self.followers = [User.objects.create_user(username=f'f{i}') for i in range(3)]
+        for follower in self.followers:
+            follower.following.add(self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    @override_settings(NOTIFICATION_OUTBOX=True)
+    def test_fan_out_leaves_the_request(self):
+        response = self.client.post('/api/posts/', {'title': 'hello', 'content': 'hi'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        self.assertEqual(outbox.drain_once(), (1, 0))
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list('user_id', flat=True)),
+            {follower.pk for follower in self.followers},
+        )
+
+    @override_settings(TIMELINE_MAX_LENGTH=3, TIMELINE_TRIM_INTERVAL=10 ** 9)
+    def test_trim_timelines_bounds_every_timeline(self):
+        for i in range(5):
+            self.client.post('/api/posts/', {'title': f'post {i}', 'content': 'hi'}, format='json')
+        outbox.drain_once()
+        self.assertEqual(TimelineEntry.objects.filter(user=self.followers[0]).count(), 5)
+
+        call_command('trim_timelines', stdout=StringIO())
+        for follower in self.followers:
+            kept = TimelineEntry.objects.filter(user=follower).order_by('-created_at')
+            self.assertEqual([entry.post.title for entry in kept], ['post 4', 'post 3', 'post 2'])
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.author, title='one', content='hi')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        enable_response_cache(self)
+
+    def test_like_only_invalidates_its_post(self):
+        for url in ('/api/posts/', f'/api/posts/{self.post.pk}/'):
+            self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.pk}/like/')
+
+        self.assertEqual(self.client.get('/api/posts/')['X-Cache'], 'HIT')
+        detail = self.client.get(f'/api/posts/{self.post.pk}/')
+        self.assertEqual(detail['X-Cache'], 'MISS')
+        self.assertEqual(detail.json()['like_count'], 1)
+
+    def test_new_post_invalidates_the_list(self):
+        self.client.get('/api/posts/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(author=self.author, title='two', content='hi')
+        response = self.client.get('/api/posts/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()['results']), 2)
+
+    @mock.patch.object(response_cache, 'STATS_FLUSH_EVERY', 3)
+    def test_stats_reach_the_shared_cache_in_batches(self):
+        response_cache._pending_stats.clear()
+        before = response_cache.get_stats()['posts:detail']
+        url = f'/api/posts/{self.post.pk}/'
+        self.client.get(url)
+        self.client.get(url)
+        self.assertIsNone(cache.get(response_cache.stats_key('posts:detail', 'hit')))
+        self.client.get(url)
+        after = response_cache.get_stats()['posts:detail']
+        self.assertEqual((after['hit'] - before['hit'], after['miss'] - before['miss']), (2, 1))
+
+    def test_version_stamps_expire(self):
+        for post_id in (self.post.pk, self.post.pk + 100):
+            self.client.get(f'/api/posts/{post_id}/')
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT expires FROM cache_table WHERE cache_key LIKE %s', ['%respcache:version:%'])
+            expires = [str(row[0]) for row in cursor.fetchall()]
+        self.assertTrue(expires)
+        self.assertTrue(all(value < '9999' for value in expires), expires)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.author, title='one', content='hi')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        enable_response_cache(self)
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_post_detail_etag_changes_after_like(self):
+        url = f'/api/posts/{self.post.pk}/'
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.pk}/like/')
+        second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['like_count'], 1)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+
+    def test_wildcard_matches_existing_posts_only(self):
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.pk}/', HTTP_IF_NONE_MATCH='*').status_code, 304)
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.pk + 100}/', HTTP_IF_NONE_MATCH='*').status_code, 404)
+
+    def test_username_change_invalidates_post_payloads(self):
+        url = f'/api/posts/{self.post.pk}/'
+        first = self.client.get(url)
+        self.client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/accounts/profile/', {'username': 'renamed'}, format='json')
+        second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['author'], 'renamed')
+
+    def test_post_list_etag_follows_the_payload(self):
+        first = self.client.get('/api/posts/')
+        self.assertEqual(self.revalidate('/api/posts/', first).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.pk}/like/')
+        # The cached page still holds the old counter, and the ETag agrees.
+        self.assertEqual(self.revalidate('/api/posts/', first).status_code, 304)
+
+        cache.clear()
+        second = self.revalidate('/api/posts/', first)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['results'][0]['like_count'], 1)
+
+    def test_comment_detail(self):
+        comment = Comment.objects.create(post=self.post, author=self.reader, content='hi')
+        url = f'/api/comments/{comment.pk}/'
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        self.client.patch(url, {'content': 'edited'}, format='json')
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+        self.assertEqual(self.client.get('/api/comments/abc/').status_code, 404)
+        self.assertEqual(self.client.get('/api/comments/999999/').status_code, 404)
+
+
+class ResponseCacheBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = get_user_model().objects.create_user(username='author')
+        self.post = Post.objects.create(author=author, title='one', content='hi')
+        self.client = APIClient()
+
+    def test_database_cache_is_bypassed(self):
+        self.assertEqual(self.client.get('/api/posts/')['X-Cache'], 'BYPASS')
+        self.assertFalse(cache.get_many([response_cache.version_key('posts')]))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_is_bypassed(self):
+        self.assertEqual(self.client.get('/api/posts/')['X-Cache'], 'BYPASS')
+        self.assertEqual(self.client.get('/api/posts/')['X-Cache'], 'BYPASS')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_cache_uses_payload_etags(self):
+        url = f'/api/posts/{self.post.pk}/'
+        first = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        Post.objects.filter(pk=self.post.pk).update(like_count=7)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+
+class BatchLikeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.user, title='one', content='hi')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_out_of_range_ids_are_rejected(self):
+        response = self.client.post('/api/likes/batch/', {'like': [2 ** 63]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_like_and_unlike(self):
+        response = self.client.post('/api/likes/batch/', {'like': [self.post.pk, 2 ** 63 - 1]}, format='json')
+        self.assertEqual(response.json(), {'liked': [self.post.pk], 'unliked': []})
+        response = self.client.post('/api/likes/batch/', {'unlike': [self.post.pk]}, format='json')
+        self.assertEqual(response.json(), {'liked': [], 'unliked': [self.post.pk]})
+
+
+class RecordingBuffer(LikeBuffer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+        self.threads = []
+        self.written = threading.Event()
+
+    def _write(self, batch):
+        self.batches.append(dict(batch))
+        self.threads.append(threading.current_thread().name)
+        self.written.set()
+
+
+class LikeBufferTests(TestCase):
+    def test_batch_is_taken_under_the_flush_lock(self):
+        buffer = RecordingBuffer(max_size=100, flush_interval=60)
+        buffer._pending[(1, 1)] = True
+        with buffer._flush_lock:
+            flusher = threading.Thread(target=buffer.flush)
+            flusher.start()
+            flusher.join(0.2)
+            # A flush waiting for an earlier one has not taken events yet,
+            # so a later unlike joins its batch instead of overtaking it.
+            buffer._pending[(1, 1)] = False
+        flusher.join()
+        self.assertEqual(buffer.batches, [{(1, 1): False}])
+
+    def test_batches_are_written_in_order(self):
+        buffer = RecordingBuffer(max_size=100, flush_interval=60)
+        buffer._pending[(1, 1)] = True
+        buffer.flush()
+        buffer._pending[(1, 1)] = False
+        buffer.flush()
+        self.assertEqual(buffer.batches, [{(1, 1): True}, {(1, 1): False}])
+
+    def test_full_buffer_flushes_off_the_request_thread(self):
+        buffer = RecordingBuffer(max_size=2, flush_interval=60)
+        try:
+            buffer.add(1, 1, True)
+            self.assertEqual(buffer.batches, [])
+            buffer.add(2, 1, True)
+            self.assertTrue(buffer.written.wait(5))
+            self.assertEqual(buffer.batches, [{(1, 1): True, (2, 1): True}])
+            self.assertEqual(buffer.threads, ['like-buffer-flush'])
+        finally:
+            buffer.stop()
+
+    def test_flushed_unlike_retracts_trending_and_bumps_the_post(self):
+        cache.clear()
+        User = get_user_model()
+        post = Post.objects.create(author=User.objects.create_user(username='author'), title='post', content='')
+        reader = User.objects.create_user(username='reader')
+        trending.record([(post.pk, 'post', post.created_at, 1)])
+        outbox.drain_once()
+        baseline = TrendingScore.objects.get(window='day', post=post).score
+
+        buffer = LikeBuffer(max_size=100, flush_interval=60)
+        buffer._pending[(reader.pk, post.pk)] = True
+        with self.captureOnCommitCallbacks(execute=True):
+            buffer.flush()
+        outbox.drain_once()
+        self.assertGreater(TrendingScore.objects.get(window='day', post=post).score, baseline)
+
+        version = response_cache.get_versions([f'post:{post.pk}'])
+        buffer._pending[(reader.pk, post.pk)] = False
+        with self.captureOnCommitCallbacks(execute=True):
+            buffer.flush()
+        outbox.drain_once()
+        self.assertFalse(Like.objects.filter(post=post).exists())
+        score = TrendingScore.objects.get(window='day', post=post).score
+        self.assertAlmostEqual(score, baseline, delta=baseline * 1e-9)
+        self.assertNotEqual(response_cache.get_versions([f'post:{post.pk}']), version)
+
+
+class TrendingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = get_user_model().objects.create_user(username='author')
+        self.posts = [Post.objects.create(author=author, title=f'post {i}', content='hi') for i in range(3)]
+        trending.record([(post.pk, 'post', post.created_at, 1) for post in self.posts])
+        comment = Comment.objects.create(post=self.posts[0], author=author, content='hi')
+        trending.record([(comment.post_id, 'comment', comment.created_at, 1)])
+        outbox.drain_once()
+
+    def test_ranking_and_limits(self):
+        client = APIClient()
+        data = client.get('/api/posts/trending/', {'window': 'hour', 'limit': 2}).json()
+        self.assertEqual([post['title'] for post in data['results']], ['post 0', 'post 2'])
+        for limit in (-5, 0):
+            response = client.get('/api/posts/trending/', {'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['results']), 1)
+        self.assertEqual(client.get('/api/posts/trending/', {'limit': 'x'}).status_code, 400)
+        self.assertEqual(client.get('/api/posts/trending/', {'window': 'year'}).status_code, 400)
+
+    @override_settings(TRENDING_MAX_ROWS=2)
+    def test_windows_keep_the_top_k(self):
+        trending.record([(self.posts[1].pk, 'like', self.posts[1].created_at, 1)])
+        outbox.drain_once()
+        for window in trending.get_windows():
+            ranked = TrendingScore.objects.filter(window=window).order_by('-score').values_list('post_id', flat=True)
+            self.assertEqual(list(ranked), [self.posts[0].pk, self.posts[1].pk])
+        # Retracting a capped-away post does not bring it back as a row.
+        trending.record([(self.posts[2].pk, 'post', self.posts[2].created_at, -1)])
+        outbox.drain_once()
+        self.assertFalse(TrendingScore.objects.filter(post=self.posts[2]).exists())
+
+    def test_like_scores_leave_the_request(self):
+        reader = get_user_model().objects.create_user(username='reader')
+        client = APIClient()
+        client.force_authenticate(reader)
+        before = TrendingScore.objects.get(window='day', post=self.posts[2]).score
+        client.post(f'/api/posts/{self.posts[2].pk}/like/')
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+        self.assertEqual(TrendingScore.objects.get(window='day', post=self.posts[2]).score, before)
+        outbox.drain_once()
+        self.assertGreater(TrendingScore.objects.get(window='day', post=self.posts[2]).score, before)
+
+    def test_rebuild_matches_incremental_scores(self):
+        before = trending.top_posts('day', 10)
+        call_command('rebuild_trending', stdout=StringIO())
+        after = trending.top_posts('day', 10)
+        self.assertEqual([post_id for post_id, _ in after], [post_id for post_id, _ in before])
+
+
+class ParsingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.author = User.objects.create_user(username='author')
+        self.bob = User.objects.create_user(username='bob')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def tags(self, post):
+        return set(PostTag.objects.filter(post=post).values_list('tag__name', flat=True))
+
+    def tag_scores(self):
+        outbox.drain_once()
+        names = dict(Tag.objects.values_list('id', 'name'))
+        # Scores decay between readings; compare them at a coarser grain.
+        return {names[tag_id]: round(score, 3) for tag_id, score in trending.top_tags('day', 10)}
+
+    def test_extraction(self):
+        self.assertEqual(parsing.extract_mentions('@bob hi @bob, mail a@b.com @ann.'), ['bob', 'ann'])
+        self.assertEqual(parsing.extract_hashtags('#Django #django #1 a&#39; #py3'), ['django', 'py3'])
+
+    def test_mentions_are_notified_once(self):
+        response = self.client.post('/api/posts/', {'title': 'hi @bob', 'content': '@author @nobody'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.client.patch(f"/api/posts/{response.json()['id']}/", {'content': '@bob again'}, format='json')
+        outbox.drain_once()
+        self.assertEqual(
+            list(Notification.objects.values_list('recipient__username', 'verb')),
+            [('bob', 'mentioned you in a post')],
+        )
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.create(author=self.author, title='#one #two', content='hi')
+        self.assertEqual(self.tags(post), {'one', 'two'})
+        post.title = '#two #three'
+        post.save()
+        self.assertEqual(self.tags(post), {'two', 'three'})
+        scores = self.tag_scores()
+        self.assertEqual(set(scores), {'two', 'three'})
+
+        # A save that finds its rows already indexed counts nothing again.
+        parsing.index_hashtags(post, created=True)
+        self.assertEqual(self.tag_scores(), scores)
+
+        post.delete()
+        self.assertEqual(self.tag_scores(), {})
+        self.assertFalse(PostTag.objects.exists())
+
+    def test_trending_tags_limit(self):
+        Post.objects.create(author=self.author, title='#one #two', content='hi')
+        outbox.drain_once()
+        for limit, count in ((-5, 1), (0, 1), (1, 1), (10, 2)):
+            response = self.client.get('/api/tags/trending/', {'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['results']), count)
@@ -0,0 +1,182 @@
+import math
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from notifications import outbox
+
+from .models import TagTrendingScore, TrendingScore
+
+DEFAULT_WINDOWS = {'hour': 3600, 'day': 86400, 'week': 604800}
+DEFAULT_WEIGHTS = {'post': 1.0, 'like': 1.0, 'comment': 2.0, 'tag': 1.0}
+
+# Landmarks advance every RENORMALIZE_EFOLDS decay constants, which keeps
+# exp((t - landmark) / tau) far below float overflow.
+RENORMALIZE_EFOLDS = 40
+PRUNE_BELOW = 1e-3
+
+_renormalized = {}
+
+
+def get_windows():
+    """
+    Trending windows mapped to their decay time constant in seconds.
+    """
+    return getattr(settings, 'TRENDING_WINDOWS', DEFAULT_WINDOWS)
+
+
+def max_rows():
+    # Rows kept per window; everything below the K-th score is dropped.
+    return getattr(settings, 'TRENDING_MAX_ROWS', 1000)
+
+
+def get_weight(kind):
+    return {**DEFAULT_WEIGHTS, **getattr(settings, 'TRENDING_WEIGHTS', {})}[kind]
+
+
+def epoch_for(tau, timestamp):
+    period = tau * RENORMALIZE_EFOLDS
+    epoch = int(timestamp // period)
+    return epoch, epoch * period
+
+
+def ensure_renormalized(window, tau, epoch, model=TrendingScore):
+    """
+    Carry scores from the previous epoch over to the current landmark and
+    drop everything that has decayed away. Runs at most once per model,
+    window and epoch in each process.
+    """
+    if _renormalized.get((model, window)) == epoch:
+        return
+    with transaction.atomic():
+        model.objects.filter(window=window, epoch=epoch - 1).update(
+            score=F('score') * math.exp(-RENORMALIZE_EFOLDS), epoch=epoch,
+        )
+        model.objects.filter(window=window, epoch__lt=epoch).delete()
+        _cap(model, window, epoch)
+    _renormalized[(model, window)] = epoch
+
+
+def _cap(model, window, epoch):
+    """
+    Keep ``window`` a compact top-K: drop rows below the ``max_rows()``-th
+    score and rows that have decayed away.
+    """
+    cutoff = PRUNE_BELOW
+    kth = list(
+        model.objects.filter(window=window, epoch=epoch)
+        .order_by('-score')
+        .values_list('score', flat=True)[max_rows() - 1:max_rows()]
+    )
+    if kth:
+        cutoff = max(cutoff, kth[0])
+    model.objects.filter(window=window, epoch=epoch, score__lt=cutoff).delete()
+
+
+def reset():
+    """
+    Forget which epochs this process has renormalized, e.g. after the
+    scores were rebuilt from scratch.
+    """
+    _renormalized.clear()
+
+
+def _add(model, key, window, epoch, object_id, amount):
+    updated = model.objects.filter(window=window, epoch=epoch, **{key: object_id}).update(
+        score=F('score') + amount,
+    )
+    if updated or amount <= 0:
+        # Retractions for rows that were capped away have nothing to undo.
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(window=window, epoch=epoch, score=amount, **{key: object_id})
+    except IntegrityError:
+        model.objects.filter(window=window, **{key: object_id}).update(
+            score=F('score') + amount, epoch=epoch,
+        )
+
+
+def _record(model, key, rows):
+    now = time.time()
+    for window, tau in get_windows().items():
+        epoch, landmark = epoch_for(tau, now)
+        ensure_renormalized(window, tau, epoch, model)
+        amounts = defaultdict(float)
+        for object_id, kind, when, sign in rows:
+            amounts[object_id] += sign * get_weight(kind) * math.exp((when - landmark) / tau)
+        for object_id, amount in amounts.items():
+            _add(model, key, window, epoch, object_id, amount)
+        _cap(model, window, epoch)
+
+
+def _top(model, key, window, limit):
+    tau = get_windows()[window]
+    now = time.time()
+    epoch, landmark = epoch_for(tau, now)
+    ensure_renormalized(window, tau, epoch, model)
+    rows = (
+        model.objects.filter(window=window, epoch=epoch, score__gt=0)
+        .order_by('-score')
+        .values_list(key, 'score')[:limit]
+    )
+    decay = math.exp(-(now - landmark) / tau)
+    return [(object_id, score * decay) for object_id, score in rows]
+
+
+def _rows(events):
+    return [[object_id, kind, when.timestamp(), sign] for object_id, kind, when, sign in events]
+
+
+def post_events(events):
+    """
+    Outbox part folding ``(post_id, kind, when, sign)`` events into every
+    window. ``sign`` is ``-1`` to retract an earlier event (e.g. an
+    unlike). Scores are written by the outbox worker, so requests never
+    contend on the hot rows.
+    """
+    return 'trending', _rows(events)
+
+
+def tag_events(events):
+    """
+    Outbox part folding ``(tag_id, kind, when, sign)`` hashtag events into
+    every window.
+    """
+    return 'trending_tags', _rows(events)
+
+
+def record(events):
+    outbox.enqueue_many([post_events(events)])
+
+
+def record_tags(events):
+    outbox.enqueue_many([tag_events(events)])
+
+
+def apply_post_events(rows):
+    # outbox.TASKS handler for post_events().
+    _record(TrendingScore, 'post_id', rows)
+
+
+def apply_tag_events(rows):
+    # outbox.TASKS handler for tag_events().
+    _record(TagTrendingScore, 'tag_id', rows)
+
+
+def top_posts(window, limit):
+    """
+    Ids and current decayed scores of the ``limit`` hottest posts, read
+    straight off the ``(window, epoch, -score)`` index.
+    """
+    return _top(TrendingScore, 'post_id', window, limit)
+
+
+def top_tags(window, limit):
+    """
+    Ids and current decayed scores of the ``limit`` most used hashtags.
+    """
+    return _top(TagTrendingScore, 'tag_id', window, limit)
@@ -1,15 +1,21 @@
 from rest_framework.routers import DefaultRouter
 from .views import PostViewSet, CommentViewSet
 from django.urls import path
-from .views import LikePostView, UnlikePostView
+from .views import LikePostView, UnlikePostView, BatchLikeView, LikeBufferStatsView, FeedView, TrendingPostsView, TagPostsView, TrendingTagsView
 
 router = DefaultRouter()
 router.register('posts', PostViewSet)
 router.register('comments', CommentViewSet)
 
 urlpatterns = [
+    path('feed/', FeedView.as_view(), name='feed'),
+    path('posts/trending/', TrendingPostsView.as_view(), name='trending-posts'),
+    path('tags/trending/', TrendingTagsView.as_view(), name='trending-tags'),
+    path('tags/<str:tag>/posts/', TagPostsView.as_view(), name='tag-posts'),
     path('posts/<int:pk>/like/', LikePostView.as_view(), name='like-post'),
     path('posts/<int:pk>/unlike/', UnlikePostView.as_view(), name='unlike-post'),
+    path('likes/batch/', BatchLikeView.as_view(), name='batch-like'),
+    path('likes/buffer/', LikeBufferStatsView.as_view(), name='like-buffer-stats'),
 ]
 
-urlpatterns = router.urls
+urlpatterns += router.urls
@@ -1,79 +1,303 @@
-from django.shortcuts import render
-from rest_framework import permissions, status
-from rest_framework.views import APIView
-from rest_framework.response import Response
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 from django.shortcuts import get_object_or_404
-from .models import Post, Like
-from notifications.models import Notification
-from django.contrib.contenttypes.models import ContentType
-from rest_framework import viewsets, permissions, filters
-from rest_framework.pagination import PageNumberPagination
-from .models import Post, Comment
-from .serializers import PostSerializer, CommentSerializer
-from rest_framework import generics
+from rest_framework import generics, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from notifications import outbox
+
+from . import parsing, trending
+from .cache import AUTHORS_SCOPE, cached_response
+from .conditional import conditional_response, content_conditional_response, versioned_conditional_response
+from .feed import FEED_ORDERING, FeedEngine
+from .filters import PostSearchFilter
+from .like_buffer import get_buffer, write_behind_enabled
+from .likes import like_posts, unlike_posts
+from .models import Comment, Post, Tag
+from .pagination import KeysetPagination, parse_limit
+from .serializers import CommentSerializer, LikeBatchSerializer, PostSerializer
+
+
 class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
             return True
         return obj.author == request.user
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
-
 class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.all().order_by('-created_at')
+    queryset = Post.objects.all().order_by('-created_at', '-id')
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
-    pagination_class = StandardResultsSetPagination
-    filter_backends = [filters.SearchFilter]
+    pagination_class = KeysetPagination
+    filter_backends = [PostSearchFilter]
     search_fields = ['title', 'content']
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_comment_preview()
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # Cached pages may carry counters up to a TTL old, so the ETag is
+        # taken from the payload rather than from the 'posts' version.
+        return content_conditional_response(request, lambda: cached_response(
+            request, 'posts:list', ['posts', AUTHORS_SCOPE],
+            lambda: super(PostViewSet, self).list(request, *args, **kwargs),
+        ))
+
+    def retrieve(self, request, *args, **kwargs):
+        scopes = [f"post:{kwargs['pk']}", AUTHORS_SCOPE]
+        return versioned_conditional_response(request, scopes, lambda: cached_response(
+            request, 'posts:detail', scopes,
+            lambda: super(PostViewSet, self).retrieve(request, *args, **kwargs),
+        ))
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if getattr(self, 'search_truncated', None) is not None:
+            response.data['search_truncated'] = self.search_truncated
+        return response
+
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        # Fan-out writes a row per follower; the outbox worker does it, along
+        # with trending and mentions, all recorded with one insert.
+        outbox.enqueue_many([
+            ('fanout', [[post.pk]]),
+            trending.post_events([(post.pk, 'post', post.created_at, 1)]),
+            parsing.mention_notifications('mention', parsing.post_text(post), post.author_id, post.pk),
+        ])
+
+    def perform_update(self, serializer):
+        previous_text = parsing.post_text(serializer.instance)
+        post = serializer.save()
+        parsing.notify_mentions('mention', parsing.post_text(post), post.author_id, post.pk, previous_text)
+
+    @action(detail=True, methods=['get'])
+    def comments(self, request, pk=None):
+        """
+        Paginated comment thread of a single post.
+        """
+        return versioned_conditional_response(
+            request, [f'post:{pk}', AUTHORS_SCOPE], lambda: self.build_comments(pk),
+        )
+
+    def build_comments(self, pk):
+        post = generics.get_object_or_404(Post, pk=pk)
+        queryset = post.comments.select_related('author').order_by('-created_at', '-id')
+        page = self.paginate_queryset(queryset)
+        serializer = CommentSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
 
 class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all().order_by('-created_at')
+    queryset = Comment.objects.select_related('author').order_by('-created_at', '-id')
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = KeysetPagination
+
+    def list(self, request, *args, **kwargs):
+        return versioned_conditional_response(
+            request, ['comments', AUTHORS_SCOPE], lambda: super(CommentViewSet, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        comment = self.get_object()
+        return conditional_response(
+            request, lambda: Response(self.get_serializer(comment).data),
+            f'{comment.pk}:{comment.updated_at.isoformat()}:{comment.author.username}', comment.updated_at.timestamp(),
+        )
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        comment = serializer.save(author=self.request.user)
+        Post.objects.filter(pk=comment.post_id).update(comment_count=F('comment_count') + 1)
+        outbox.enqueue_many([
+            ('comment', outbox.notification_rows([(comment.post.author_id, comment.author_id, comment.post_id)])),
+            parsing.mention_notifications('comment_mention', comment.content, comment.author_id, comment.post_id),
+            trending.post_events([(comment.post_id, 'comment', comment.created_at, 1)]),
+        ])
+
+    def perform_update(self, serializer):
+        previous_text = serializer.instance.content
+        comment = serializer.save()
+        parsing.notify_mentions('comment_mention', comment.content, comment.author_id, comment.post_id, previous_text)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        post_id, created_at = instance.post_id, instance.created_at
+        instance.delete()
+        Post.objects.filter(pk=post_id).update(comment_count=F('comment_count') - 1)
+        trending.record([(post_id, 'comment', created_at, -1)])
 
 
 
 class LikePostView(APIView):
+    """
+    Idempotent like: one ``INSERT ... ON CONFLICT DO NOTHING`` whose result
+    tells whether anything changed.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        post = generics.get_object_or_404(Post, pk=pk)
+        if write_behind_enabled():
+            get_buffer().add(request.user.pk, pk, True)
+            return Response({'detail': 'Like accepted.', 'queued': True}, status=status.HTTP_202_ACCEPTED)
 
-        Like.objects.get_or_create(user=request.user, post=post)
-        if not Like.objects.filter(post=post, user=request.user).exists():
-            return Response({'detail': 'You already liked this post.'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if post.author != request.user:
-            Notification.objects.create(
-                recipient=post.author,
-                actor=request.user,
-                verb='liked your post',
-                target=post,
-            )
-
-        return Response({'detail': 'Post liked successfully!'}, status=status.HTTP_200_OK)
+        changed = bool(like_posts(request.user, [pk]))
+        if not changed:
+            generics.get_object_or_404(Post, pk=pk)
+            return Response({'detail': 'You already liked this post.', 'changed': False}, status=status.HTTP_200_OK)
+        return Response({'detail': 'Post liked successfully!', 'changed': True}, status=status.HTTP_200_OK)
 
 
 class UnlikePostView(APIView):
+    """
+    Idempotent unlike: one ``DELETE ... RETURNING`` whose result tells
+    whether anything changed.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        post = generics.get_object_or_404(Post, pk=pk)
-        like = Like.objects.filter(post=post, user=request.user)
+        if write_behind_enabled():
+            get_buffer().add(request.user.pk, pk, False)
+            return Response({'detail': 'Unlike accepted.', 'queued': True}, status=status.HTTP_202_ACCEPTED)
+
+        changed = bool(unlike_posts(request.user, [pk]))
+        if not changed:
+            generics.get_object_or_404(Post, pk=pk)
+            return Response({'detail': 'You have not liked this post.', 'changed': False}, status=status.HTTP_200_OK)
+        return Response({'detail': 'Post unliked successfully!', 'changed': True}, status=status.HTTP_200_OK)
+
+
+class BatchLikeView(APIView):
+    """
+    Like and unlike up to ``LIKE_BATCH_MAX_SIZE`` posts for the current user
+    in one request. Returns the ids whose state actually changed.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = LikeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if write_behind_enabled():
+            buffer = get_buffer()
+            for post_id in serializer.validated_data['like']:
+                buffer.add(request.user.pk, post_id, True)
+            for post_id in serializer.validated_data['unlike']:
+                buffer.add(request.user.pk, post_id, False)
+            return Response({'detail': 'Batch accepted.', 'queued': True}, status=status.HTTP_202_ACCEPTED)
+
+        liked = like_posts(request.user, serializer.validated_data['like'])
+        unliked = unlike_posts(request.user, serializer.validated_data['unlike'])
+        return Response({'liked': liked, 'unliked': unliked}, status=status.HTTP_200_OK)
+
+
+class LikeBufferStatsView(APIView):
+    """
+    Depth and flush latency of this process's like write-behind buffer.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({'enabled': write_behind_enabled(), **get_buffer().stats()})
+
+
+class TrendingPostsView(generics.ListAPIView):
+    """
+    Hottest posts of a window (``?window=hour|day|week``) ranked by
+    exponentially decayed likes, comments and post age.
+    """
+    serializer_class = PostSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+
+    def list(self, request, *args, **kwargs):
+        window = request.query_params.get('window', 'day')
+        if window not in trending.get_windows():
+            raise ValidationError({'window': f"Choose one of: {', '.join(trending.get_windows())}."})
+        limit = parse_limit(request, 20, getattr(settings, 'TRENDING_MAX_RESULTS', 50))
+        ranked = trending.top_posts(window, limit)
+        posts = Post.objects.with_comment_preview().in_bulk([post_id for post_id, _ in ranked])
+        results = []
+        for post_id, score in ranked:
+            if post_id in posts:
+                data = self.get_serializer(posts[post_id]).data
+                data['trending_score'] = round(score, 6)
+                results.append(data)
+        return Response({'window': window, 'results': results})
+
+
+class TagPostsView(generics.ListAPIView):
+    """
+    Posts carrying ``#tag``, newest first, paged over the hashtag index.
+    """
+    serializer_class = PostSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+
+    def list(self, request, *args, **kwargs):
+        tag = get_object_or_404(Tag, name=kwargs['tag'].lower())
+        paginator = self.paginator
+        paginator.ordering = FEED_ORDERING
+        page = paginator.paginate_rows(
+            lambda values, reverse, limit: parsing.tagged_posts(tag.pk, values, reverse, limit), request, Post,
+        )
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class TrendingTagsView(APIView):
+    """
+    Most used hashtags of a window (``?window=hour|day|week``), with usage
+    decayed the same way as trending posts.
+    """
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+
+    def get(self, request):
+        window = request.query_params.get('window', 'day')
+        if window not in trending.get_windows():
+            raise ValidationError({'window': f"Choose one of: {', '.join(trending.get_windows())}."})
+        limit = parse_limit(request, 20, getattr(settings, 'TRENDING_MAX_RESULTS', 50))
+
+        ranked = trending.top_tags(window, limit)
+        names = dict(Tag.objects.filter(pk__in=[tag_id for tag_id, _ in ranked]).values_list('id', 'name'))
+        results = [
+            {'tag': names[tag_id], 'trending_score': round(score, 6)}
+            for tag_id, score in ranked if tag_id in names
+        ]
+        return Response({'window': window, 'results': results})
+
+
+class FeedView(generics.ListAPIView):
+    """
+    Home feed of the authenticated user. Posts of regular authors are read
+    from the materialized timeline and posts of high-follower authors are
+    merged in at read time; the ``X-Feed-Source`` header reports which path
+    served the request.
+    """
+    serializer_class = PostSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
-        if not like.exists():
-            return Response({'detail': 'You have not liked this post.'}, status=status.HTTP_400_BAD_REQUEST)
+    def list(self, request, *args, **kwargs):
+        # Fan-out bumps the feed scope of every follower it writes to; posts
+        # pulled at read time and counter changes show up within the TTL.
+        return cached_response(
+            request, 'feed', [f'feed:{request.user.pk}', AUTHORS_SCOPE],
+            lambda: self.build_feed(request), user=request.user,
+        )
 
-        like.delete()
-        return Response({'detail': 'Post unliked successfully!'}, status=status.HTTP_200_OK)
+    def build_feed(self, request):
+        engine = FeedEngine(request.user)
+        paginator = self.paginator
+        paginator.ordering = FEED_ORDERING
+        page = paginator.paginate_rows(engine.fetch, request, Post)
+        serializer = self.get_serializer(page, many=True)
+        response = paginator.get_paginated_response(serializer.data)
+        response['X-Feed-Source'] = engine.source
+        return response
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     "accounts",
     'rest_framework.authtoken',
     'posts',
+    'notifications',
 ]
 
 MIDDLEWARE = [
@@ -126,7 +127,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'accounts.CoustomUser'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
     ],
 }
 # Security
@@ -142,3 +143,22 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', 'unsafe-secret-key')
 DATABASE_URL = os.environ.get('DATABASE_URL')
+
+# The token cache, unread counts and the notification stream relay must be
+# visible to every process, so the default cache is shared: Redis when
+# REDIS_URL is set, else the database cache (run ``manage.py
+# createcachetable``). Response caching is skipped on the database cache.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_table',
+        }
+    }
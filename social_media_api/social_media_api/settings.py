@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -40,6 +41,7 @@ INSTALLED_APPS = [
     "accounts",
     'rest_framework.authtoken',
     'posts',
+    'notifications',
 ]
 
 MIDDLEWARE = [
@@ -126,6 +128,108 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'accounts.CoustomUser'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
     ],
-}
\ No newline at end of file
+}
+
+# The token cache, unread counts and the notification stream relay must be
+# visible to every process, so the default cache is shared: Redis when
+# REDIS_URL is set, else the database cache (run ``manage.py
+# createcachetable``). Response caching is only on with Redis; see
+# RESPONSE_CACHE.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_table',
+        }
+    }
+
+# Posts
+POST_COMMENT_PREVIEW_SIZE = 3
+SEARCH_MAX_RESULTS = 500
+TIMELINE_MAX_LENGTH = 800
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+TIMELINE_TRIM_INTERVAL = 50
+FEED_FANOUT_FOLLOWER_THRESHOLD = 10000
+LIKE_BATCH_MAX_SIZE = 100
+LIKE_WRITE_BEHIND = False
+LIKE_BUFFER_MAX_SIZE = 500
+LIKE_BUFFER_FLUSH_INTERVAL = 1.0
+TRENDING_WINDOWS = {
+    'hour': 3600,
+    'day': 86400,
+    'week': 604800,
+}
+TRENDING_WEIGHTS = {
+    'post': 1.0,
+    'like': 1.0,
+    'comment': 2.0,
+    'tag': 1.0,
+}
+TRENDING_MAX_RESULTS = 50
+TRENDING_MAX_ROWS = 1000
+MENTIONS_MAX_PER_TEXT = 20
+HASHTAGS_MAX_PER_POST = 20
+# Response caching needs a cache cheaper than the queries it saves, so it
+# is only on with Redis.
+RESPONSE_CACHE = bool(os.environ.get('REDIS_URL'))
+RESPONSE_CACHE_TTLS = {
+    'posts:list': 30,
+    'posts:detail': 60,
+    'feed': 15,
+}
+
+# Notifications
+NOTIFICATION_AGGREGATION_WINDOW = 86400
+NOTIFICATION_LATEST_ACTORS = 5
+NOTIFICATION_UNREAD_TTL = 300
+NOTIFICATION_OUTBOX = True
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF_BASE = 2.0
+OUTBOX_BACKOFF_MAX = 600.0
+OUTBOX_LEASE = 60
+NOTIFICATION_STREAM_HEARTBEAT = 15
+NOTIFICATION_STREAM_RELAY = True
+NOTIFICATION_STREAM_RELAY_INTERVAL = 2
+NOTIFICATION_RETENTION_DAYS = 90
+NOTIFICATION_MAX_PER_RECIPIENT = 1000
+
+# Accounts
+AUTH_TOKEN_CACHE_TTL = 300
+AUTH_TOKEN_LOCAL_CACHE_TTL = 30
+AUTH_TOKEN_LOCAL_CACHE_SIZE = 10000
+PASSWORD_HASH_POOL = True
+PASSWORD_HASH_WORKERS = None
+PASSWORD_HASH_QUEUE_DEPTH = 8
+PASSWORD_HASH_TIMEOUT = 10
+RECOMMENDATION_RELOAD_INTERVAL = 600
+RECOMMENDATION_COMPACT_THRESHOLD = 10000
+RECOMMENDATION_MAX_FANOUT = 1000
+RECOMMENDATION_MAX_RESULTS = 50
+AUTOCOMPLETE_MAX_RESULTS = 20
+AUTOCOMPLETE_RELOAD_INTERVAL = 600
+AUTOCOMPLETE_MEMO_DEPTH = 2
+PROFILE_PICTURE_SIZES = {
+    'small': 64,
+    'medium': 256,
+    'large': 512,
+}
+PROFILE_PICTURE_WORKERS = 2
+# Spool uploads to disk instead of holding them in memory.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# Resumable uploads: partial files live here until finalized or expired.
+CHUNKED_UPLOAD_DIR = BASE_DIR / 'uploads'
+CHUNKED_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+CHUNKED_UPLOAD_CHUNK_SIZE = 1024 * 1024
+CHUNKED_UPLOAD_EXPIRY = 24 * 3600